@@ -4,9 +4,10 @@ Uses Supabase PostgreSQL exclusively for all environments.
 """
 import os
 import sys
+import threading
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
@@ -54,7 +55,56 @@ def get_db():
     finally:
         db.close()
 
+# Indexes added to tables after they first shipped: create_all never touches existing
+# tables, so these are created here. CONCURRENTLY avoids locking writes on live tables;
+# IF NOT EXISTS makes it a no-op once they exist (and on tables create_all just made).
+POST_CREATE_INDEXES = {
+    "ix_messages_conversation_id_created_at": "ON messages (conversation_id, created_at)",
+    "ix_conversations_status_updated_at": "ON conversations (status, updated_at DESC)",
+}
+# Arbitrary application-wide advisory lock id for ensure_indexes
+INDEX_LOCK_KEY = 72150419
+
+def ensure_indexes():
+    """
+    Create POST_CREATE_INDEXES that don't exist yet (CONCURRENTLY can't run in a transaction).
+    A failed concurrent build leaves an INVALID index that IF NOT EXISTS would skip forever,
+    so invalid ones are dropped and rebuilt. Failures are logged, never raised.
+    """
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # One worker at a time, so nobody drops an index another worker is still building
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": INDEX_LOCK_KEY}).scalar():
+                return
+            for name, definition in POST_CREATE_INDEXES.items():
+                try:
+                    valid = conn.execute(
+                        text(
+                            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                            "WHERE c.relname = :name"
+                        ),
+                        {"name": name}
+                    ).scalar()
+                    if valid:
+                        continue
+                    if valid is False:
+                        print(f"[STARTUP] Rebuilding invalid index {name}")
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                    conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+                except Exception as e:
+                    print(f"[STARTUP] Could not create index {name}: {e}")
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEX_LOCK_KEY})
+    except Exception as e:
+        print(f"[STARTUP] Index check skipped: {e}")
+
 def init_db():
-    """Initialize database tables."""
-    Base.metadata.create_all(bind=engine)
+    """Initialize database tables (only creates the ones that don't exist yet)."""
+    # One get_table_names() query instead of create_all checking every table;
+    # restarts against a fully-migrated DB skip create_all entirely
+    existing = set(inspect(engine).get_table_names())
+    missing = [table for name, table in Base.metadata.tables.items() if name not in existing]
+    if missing:
+        Base.metadata.create_all(bind=engine, tables=missing)
+    # Index builds can take a while on large tables - keep them off the startup path
+    threading.Thread(target=ensure_indexes, name="ensure-indexes", daemon=True).start()
 
@@ -2,6 +2,7 @@
 Main FastAPI application for AI Customer Support System.
 Implements RESTful API for chatbot, agent supervision, and analytics.
 """
+import asyncio
 import logging
 import os
 
@@ -308,6 +309,9 @@ async def startup_event():
     else:
         print("[STARTUP] Database connection verified (AUTO_CREATE_TABLES=false)")
 
+    # Re-store legacy encrypted API keys once here, so GET/chat paths never write
+    _migrate_legacy_api_keys()
+
     # Lightweight startup - only log provider info, don't verify (saves memory)
     # Set VERIFY_LLM_ON_STARTUP=true to enable verification (uses more memory)
     verify_llm = os.getenv("VERIFY_LLM_ON_STARTUP", "false").lower() == "true"
@@ -319,7 +323,12 @@ async def startup_event():
     
     logger = logging.getLogger(__name__)
     
+    # Also warms the provider registry so imports aren't paid on the first request
     available_providers = list_available_providers()
+    
+    # Pooled HTTP/2 client for HF Inference (huggingface_hub >= 1.0)
+    from app.services.llm_providers.huggingface_inference_provider import configure_http_client
+    configure_http_client()
     default_config = get_default_llm_config()
     
     print(f"[LLM] Available providers: {', '.join(available_providers) if available_providers else 'none'}")
@@ -339,7 +348,7 @@ async def startup_event():
         try:
             default_provider = get_provider(default_provider_name, {"model": default_model})
             if default_provider:
-                is_available = default_provider.is_available()
+                is_available = await default_provider.check_available()
                 actual_model = default_model
                 if hasattr(default_provider, 'get_active_model'):
                     try:
@@ -385,6 +394,18 @@ async def startup_event():
     else:
         print("[LLM] [INFO] LLM verification skipped on startup (set VERIFY_LLM_ON_STARTUP=true to enable)")
     
+    # Warm up the configured model in the background so cold loads don't hit the first user
+    # Set WARMUP_LLM_ON_STARTUP=true to enable model loading (local models are loaded into memory);
+    # connection-only warmups (e.g. OpenAI TLS) always run
+    warmup_models = os.getenv("WARMUP_LLM_ON_STARTUP", "false").lower() == "true"
+    app.state.llm_warmup_task = asyncio.create_task(_warmup_llm(warmup_models))
+    if warmup_models:
+        print("[LLM] Warming up configured model in the background")
+    
+    # Create the Supabase Storage client now so the first upload/download doesn't pay for it
+    from app.services.storage_service import get_supabase_client
+    app.state.storage_warmup_task = asyncio.create_task(asyncio.to_thread(get_supabase_client))
+    
     # Legacy Ollama check for backward compatibility
     if OLLAMA_AVAILABLE:
         print(f"[LLM] Ollama also available - using {OLLAMA_MODEL}")
@@ -392,6 +413,46 @@ async def startup_event():
     print("[SERVER] Running at http://localhost:8000")
     print("[DOCS] API documentation available at http://localhost:8000/docs")
 
+def _migrate_legacy_api_keys():
+    """Rewrite legacy (unmarked) encrypted API keys; failures are logged, never raised."""
+    from app.database import SessionLocal
+    from app.services.llm_service import migrate_legacy_api_keys
+
+    db = SessionLocal()
+    try:
+        migrated = migrate_legacy_api_keys(db)
+        if migrated:
+            print(f"[STARTUP] Re-encrypted {migrated} legacy API key configuration(s)")
+    except Exception as e:
+        db.rollback()
+        logging.getLogger(__name__).warning(f"[STARTUP] API key migration failed: {e}")
+    finally:
+        db.close()
+
+async def _warmup_llm(load_models: bool):
+    """Warm up the configured LLM provider; failures are logged, never raised."""
+    from app.database import SessionLocal
+    from app.services.llm_service import warmup_llm_provider
+
+    db = SessionLocal()
+    try:
+        await warmup_llm_provider(db, load_models=load_models)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"[STARTUP] LLM warmup failed: {e}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared LLM client connections on shutdown."""
+    from app.services.llm_providers.huggingface_inference_provider import close_inference_clients
+    from app.services.llm_providers.ollama_provider import OllamaProvider
+    from app.services.llm_providers.openai_provider import close_http_client as close_openai_http_client
+
+    await close_inference_clients()
+    await OllamaProvider.close_http_client()
+    await close_openai_http_client()
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
@@ -13,6 +13,7 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -132,6 +133,11 @@ class Conversation(Base):
     # Relationships
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
     feedback = relationship("Feedback", back_populates="conversation", cascade="all, delete-orphan")
+    
+    # Conversation list: optional status filter, newest activity first
+    __table_args__ = (
+        Index("ix_conversations_status_updated_at", "status", updated_at.desc()),
+    )
 
 
 class Message(Base):
@@ -151,6 +157,11 @@ class Message(Base):
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    # Message history: WHERE conversation_id ... ORDER BY created_at, served straight from the index
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+    )
 
 
 class KnowledgeBase(Base):
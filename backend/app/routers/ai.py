@@ -3,17 +3,39 @@ AI service endpoints.
 Handles LLM response generation with confidence scoring.
 """
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+import logging
+import os
+from typing import AsyncIterator, List, Optional
 
 from app.database import get_db
-from app.services.llm_service import generate_ai_response  # Keep for backward compatibility
+from app.services.llm_service import generate_ai_response, stream_ai_response  # Keep for backward compatibility
 from app.services.agent_orchestrator import orchestrate_response
 from app.middleware.auth import require_api_key
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Hard cap on bytes sent over one streaming response, whatever the provider
+AI_STREAM_MAX_BYTES = int(os.getenv("AI_STREAM_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+async def _cap_stream(chunks: AsyncIterator[str], max_bytes: int = AI_STREAM_MAX_BYTES) -> AsyncIterator[str]:
+    """Forward text chunks until max_bytes is reached, then end with a truncation marker."""
+    sent = 0
+    async for chunk in chunks:
+        data = chunk.encode()
+        if sent + len(data) > max_bytes:
+            logger.warning(f"[AI Router] Stream truncated at {sent} bytes (limit: {max_bytes})")
+            yield "[truncated]"
+            await chunks.aclose()
+            return
+        sent += len(data)
+        yield chunk
+
 
 class AIGenerateRequest(BaseModel):
     conversation_id: int
@@ -82,3 +104,24 @@ async def generate_response(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
+
+@router.post("/generate/stream")
+async def generate_response_stream(
+    request: AIGenerateRequest,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(require_api_key)
+):
+    """
+    Stream an AI response as plain text chunks while the LLM generates it.
+    Time-to-first-token instead of full completion latency; confidence scoring
+    and agent routing are only available via /generate.
+    """
+    return StreamingResponse(
+        _cap_stream(stream_ai_response(
+            conversation_id=request.conversation_id,
+            user_message=request.user_message,
+            db=db
+        )),
+        media_type="text/plain"
+    )
+
@@ -8,7 +8,7 @@ from app.database import get_db
 from app.middleware.auth import require_api_key
 from app.models import TenantConfiguration
 from app.services.llm_providers.encryption import decrypt_llm_config, encrypt_llm_config
-from app.services.llm_providers.factory import get_provider, list_available_providers
+from app.services.llm_providers.factory import get_provider, invalidate, list_available_providers
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
@@ -141,6 +141,8 @@ async def update_configuration(
     if update.llm_config is not None:
         # Encrypt API keys before storing
         config.llm_config = encrypt_llm_config(update.llm_config)
+        # Drop provider instances holding the previous credentials
+        invalidate(config.llm_provider)
     if update.embedding_model is not None:
         config.embedding_model = update.embedding_model
     if update.tone is not None:
@@ -247,14 +249,14 @@ async def test_llm_connection(
     
     # Check availability
     if hasattr(provider, 'get_availability_info'):
-        available, message = provider.get_availability_info()
+        available, message = await provider.get_availability_info(force=True)
         if not available:
             logger.warning(
                 f"[LLM Test] Provider not available - Provider: {test_request.provider}, "
                 f"Model: {test_request.model}, Message: {message}"
             )
             raise HTTPException(status_code=400, detail=message)
-    elif not provider.is_available():
+    elif not await provider.check_available():
         logger.warning(
             f"[LLM Test] Provider not available - Provider: {test_request.provider}, "
             f"Model: {test_request.model}"
@@ -10,7 +10,7 @@ from datetime import datetime
 
 from app.database import get_db
 from app.models import KnowledgeBase
-from app.services.rag_service import add_article_to_vector_db
+from app.services.rag_service import add_article_to_vector_db, invalidate_knowledge_base_caches
 from app.middleware.auth import require_api_key
 from app.middleware.admin_auth import require_admin_auth
 
@@ -140,6 +140,8 @@ async def update_article(
     # Regenerate embedding if content changed
     if update.content is not None or update.title is not None:
         add_article_to_vector_db(article.id, article.title, article.content, db)
+    else:
+        invalidate_knowledge_base_caches()
     
     return article
 
@@ -181,6 +183,7 @@ async def delete_article(
 
     db.delete(article)
     db.commit()
+    invalidate_knowledge_base_caches()
 
     return {
         "message": "Article deleted successfully",
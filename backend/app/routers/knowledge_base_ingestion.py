@@ -13,7 +13,7 @@ from datetime import datetime
 from app.database import get_db
 from app.models import KnowledgeBase, KnowledgeBaseSource, SourceType, SourceStatus
 from app.services.document_processor import process_document
-from app.services.rag_service import add_article_to_vector_db
+from app.services.rag_service import add_articles_to_vector_db, invalidate_knowledge_base_caches
 from app.services.storage_service import upload_file_to_supabase, get_supabase_client
 from app.middleware.auth import require_api_key
 import tempfile
@@ -80,26 +80,29 @@ async def upload_pdf(
         db.refresh(source)
         
         # Create knowledge base articles
-        articles_created = 0
-        for article_data in articles:
-            kb_article = KnowledgeBase(
+        kb_articles = [
+            KnowledgeBase(
                 title=article_data["title"],
                 content=article_data["content"],
                 category=article_data["category"],
                 tags=article_data["tags"],
                 source_id=source.id
             )
-            db.add(kb_article)
-            db.flush()
-            
-            # Generate embedding
-            add_article_to_vector_db(kb_article.id, kb_article.title, kb_article.content, db)
-            articles_created += 1
+            for article_data in articles
+        ]
+        db.add_all(kb_articles)
+        db.flush()
+        articles_created = len(kb_articles)
+        
+        # Generate embeddings in one batch
+        add_articles_to_vector_db(kb_articles, db)
         
         # Update source status
         source.status = SourceStatus.ACTIVE
         source.last_synced_at = datetime.utcnow()
         db.commit()
+        # Only now are the new articles visible to other sessions' keyword index rebuilds
+        invalidate_knowledge_base_caches()
         
         return UploadResponse(
             message=f"PDF processed successfully",
@@ -168,26 +171,29 @@ async def upload_csv(
         db.refresh(source)
         
         # Create knowledge base articles
-        articles_created = 0
-        for article_data in articles:
-            kb_article = KnowledgeBase(
+        kb_articles = [
+            KnowledgeBase(
                 title=article_data["title"],
                 content=article_data["content"],
                 category=article_data["category"],
                 tags=article_data["tags"],
                 source_id=source.id
             )
-            db.add(kb_article)
-            db.flush()
-            
-            # Generate embedding
-            add_article_to_vector_db(kb_article.id, kb_article.title, kb_article.content, db)
-            articles_created += 1
+            for article_data in articles
+        ]
+        db.add_all(kb_articles)
+        db.flush()
+        articles_created = len(kb_articles)
+        
+        # Generate embeddings in one batch
+        add_articles_to_vector_db(kb_articles, db)
         
         # Update source status
         source.status = SourceStatus.ACTIVE
         source.last_synced_at = datetime.utcnow()
         db.commit()
+        # Only now are the new articles visible to other sessions' keyword index rebuilds
+        invalidate_knowledge_base_caches()
         
         # Clean up temporary file
         if file_path and file_path.startswith(tempfile.gettempdir()):
@@ -267,26 +273,29 @@ async def upload_document(
         db.refresh(source)
         
         # Create knowledge base articles
-        articles_created = 0
-        for article_data in articles:
-            kb_article = KnowledgeBase(
+        kb_articles = [
+            KnowledgeBase(
                 title=article_data["title"],
                 content=article_data["content"],
                 category=article_data["category"],
                 tags=article_data["tags"],
                 source_id=source.id
             )
-            db.add(kb_article)
-            db.flush()
-            
-            # Generate embedding
-            add_article_to_vector_db(kb_article.id, kb_article.title, kb_article.content, db)
-            articles_created += 1
+            for article_data in articles
+        ]
+        db.add_all(kb_articles)
+        db.flush()
+        articles_created = len(kb_articles)
+        
+        # Generate embeddings in one batch
+        add_articles_to_vector_db(kb_articles, db)
         
         # Update source status
         source.status = SourceStatus.ACTIVE
         source.last_synced_at = datetime.utcnow()
         db.commit()
+        # Only now are the new articles visible to other sessions' keyword index rebuilds
+        invalidate_knowledge_base_caches()
         
         # Clean up temporary file
         if file_path and file_path.startswith(tempfile.gettempdir()):
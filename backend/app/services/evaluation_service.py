@@ -21,7 +21,7 @@ except ImportError:
     print("⚠️  nltk not available, BLEU scores will not be calculated")
 
 # Import RAG service for embeddings
-from app.services.rag_service import generate_embedding, cosine_similarity, EMBEDDING_AVAILABLE
+from app.services.rag_service import generate_embedding, cosine_similarity, is_embedding_available
 
 
 def calculate_bleu_score(reference: str, candidate: str) -> Optional[float]:
@@ -56,7 +56,7 @@ def calculate_semantic_similarity(text1: str, text2: str) -> Optional[float]:
     Calculate semantic similarity using cosine similarity of embeddings.
     Returns None if embeddings are not available.
     """
-    if not EMBEDDING_AVAILABLE:
+    if not is_embedding_available():
         return None
     
     try:
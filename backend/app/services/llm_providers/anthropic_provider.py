@@ -4,16 +4,20 @@ Supports Claude models via Anthropic API.
 """
 import os
 import logging
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional
 
 from app.services.llm_providers.base import LLMProvider
+from app.services.llm_providers.batch_dispatcher import DEFAULT_ROUTING_POLICY, get_batch_dispatcher
+from app.services.llm_providers.cache import cached_response
+from app.services.llm_providers.retry import retry_transient
+from app.services.llm_providers.throttle import estimate_tokens, get_throttle
 
 logger = logging.getLogger(__name__)
 
 # Anthropic will be optional - fallback if not available
 ANTHROPIC_AVAILABLE = False
 try:
-    from anthropic import Anthropic
+    from anthropic import AsyncAnthropic
     ANTHROPIC_AVAILABLE = True
 except ImportError:
     pass
@@ -32,18 +36,22 @@ class AnthropicProvider(LLMProvider):
             config: Configuration dict with:
                 - model: Model name (default: "claude-3-5-sonnet-20241022")
                 - api_key: Anthropic API key (required)
+                - latency_budget_ms: Optional latency budget; requests above the routing
+                  policy's sync threshold are sent through the Message Batches API (50% cost)
         """
         self.config = config or {}
         self.model = self.config.get("model", os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022"))
         self.api_key = self.config.get("api_key") or os.getenv("ANTHROPIC_API_KEY")
         
-        self.client = None
+        self.async_client = None
         if ANTHROPIC_AVAILABLE and self.api_key:
             try:
-                self.client = Anthropic(api_key=self.api_key)
+                # Retries are handled by retry_transient so they aren't compounded with the SDK's
+                self.async_client = AsyncAnthropic(api_key=self.api_key, max_retries=0)
             except Exception as e:
-                print(f"Error initializing Anthropic client: {e}")
+                logger.error("Error initializing Anthropic client: %s", e)
     
+    @cached_response
     async def generate_response(
         self,
         prompt: str,
@@ -57,7 +65,7 @@ class AnthropicProvider(LLMProvider):
             raise Exception("Anthropic is not available")
         
         # Merge config
-        merged_config = {**self.config, **(config or {})}
+        merged_config = self._merge_config(config)
         model = merged_config.get("model", self.model)
         system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
         
@@ -67,22 +75,37 @@ class AnthropicProvider(LLMProvider):
         )
         
         try:
-            logger.debug(f"[Anthropic] Calling API - Model: {model}")
-            
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=merged_config.get("max_tokens", 1024),
-                system=system_prompt,
-                messages=[
+            params = {
+                "model": model,
+                "max_tokens": merged_config.get("max_tokens", 1024),
+                "system": system_prompt,
+                "messages": [
                     {"role": "user", "content": prompt}
                 ],
-                temperature=merged_config.get("temperature", 0.7)
-            )
+                "temperature": merged_config.get("temperature", 0.7)
+            }
             
-            # Extract text from response
-            response_text = ""
-            if response.content and len(response.content) > 0:
-                response_text = response.content[0].text
+            # Non-interactive workloads can tolerate batch turnaround for half the cost
+            latency_budget_ms = merged_config.get("latency_budget_ms")
+            if DEFAULT_ROUTING_POLICY.should_batch(latency_budget_ms):
+                logger.debug(f"[Anthropic] Queuing for batch API - Model: {model}, Latency Budget: {latency_budget_ms}ms")
+                response_text = await get_batch_dispatcher(self.api_key).submit(params, merged_config)
+            else:
+                logger.debug(f"[Anthropic] Calling API - Model: {model}")
+                
+                throttle = get_throttle(self.get_provider_name(), self.api_key, merged_config)
+                estimated_tokens = estimate_tokens(prompt, system_prompt, params["max_tokens"])
+                
+                async def _create():
+                    async with throttle.limit(estimated_tokens):
+                        return await self.async_client.messages.create(**params)
+                
+                response = await retry_transient(_create)
+                
+                # Extract text from response
+                response_text = ""
+                if response.content and len(response.content) > 0:
+                    response_text = response.content[0].text
             
             logger.info(f"[Anthropic] Generation successful - Model: {model}, Response Length: {len(response_text)}")
             
@@ -92,6 +115,44 @@ class AnthropicProvider(LLMProvider):
             logger.error(f"[Anthropic] {error_msg}", exc_info=True)
             raise Exception(error_msg)
     
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        config: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream response text from Anthropic API as it is generated.
+        """
+        if not self.is_available() or not self.async_client:
+            raise Exception("Anthropic is not available")
+        
+        merged_config = self._merge_config(config)
+        model = merged_config.get("model", self.model)
+        system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
+        max_tokens = merged_config.get("max_tokens", 1024)
+        
+        logger.info(f"[Anthropic] Streaming response - Model: {model}, Prompt Length: {len(prompt)}")
+        
+        throttle = get_throttle(self.get_provider_name(), self.api_key, merged_config)
+        try:
+            async with throttle.limit(estimate_tokens(prompt, system_prompt, max_tokens)):
+                async with self.async_client.messages.stream(
+                    model=model,
+                    max_tokens=max_tokens,
+                    system=system_prompt,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=merged_config.get("temperature", 0.7)
+                ) as stream:
+                    async for text in stream.text_stream:
+                        yield text
+        except Exception as e:
+            error_msg = f"Anthropic streaming failed for model {model}: {e}"
+            logger.error(f"[Anthropic] {error_msg}", exc_info=True)
+            raise Exception(error_msg)
+    
     def is_available(self) -> bool:
         """
         Check if Anthropic is available and configured.
@@ -102,7 +163,7 @@ class AnthropicProvider(LLMProvider):
         if not self.api_key:
             return False
         
-        if not self.client:
+        if not self.async_client:
             return False
         
         return True
@@ -3,7 +3,7 @@ Base LLM Provider interface.
 All LLM providers must implement this interface.
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional
 
 
 class LLMProvider(ABC):
@@ -32,6 +32,45 @@ class LLMProvider(ABC):
         """
         pass
     
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        config: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as text chunks.
+        Default implementation yields the full generate_response() result as one chunk;
+        providers with native streaming override this.
+        
+        Args:
+            prompt: User prompt/message
+            system_prompt: System prompt for context
+            config: Provider-specific configuration (model name, temperature, etc.)
+        
+        Yields:
+            Generated text chunks
+        """
+        yield await self.generate_response(prompt, system_prompt, config)
+    
+    def _merge_config(self, config: Optional[Dict]) -> Dict:
+        """
+        Per-request config layered over the provider's instance config.
+        Without overrides the instance config is returned as-is (callers only read it),
+        avoiding a dict copy on every request.
+        """
+        base = getattr(self, "config", None) or {}
+        if not config:
+            return base
+        return {**base, **config}
+    
+    async def warmup(self) -> None:
+        """
+        Preload the model so the first user request doesn't pay a cold-start stall.
+        Default implementation does nothing; providers with cold starts override this.
+        """
+        return None
+    
     @abstractmethod
     def is_available(self) -> bool:
         """
@@ -42,6 +81,14 @@ class LLMProvider(ABC):
         """
         pass
     
+    async def check_available(self) -> bool:
+        """
+        Availability check for async request paths.
+        Default implementation calls is_available(); providers whose check needs
+        network I/O override this so it never blocks the event loop.
+        """
+        return self.is_available()
+    
     @abstractmethod
     def get_provider_name(self) -> str:
         """
@@ -0,0 +1,212 @@
+"""
+Anthropic Message Batches dispatcher.
+Pools non-interactive requests (large latency budget) into Message Batches API calls,
+which are billed at 50% of the realtime price. Interactive requests never go through here.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.services.llm_providers.retry import retry_transient
+from app.services.llm_providers.throttle import estimate_tokens, get_throttle
+
+logger = logging.getLogger(__name__)
+
+# Anthropic will be optional - dispatcher is unused if not available
+ANTHROPIC_AVAILABLE = False
+try:
+    from anthropic import AsyncAnthropic
+    ANTHROPIC_AVAILABLE = True
+except ImportError:
+    pass
+
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    """
+    Routing thresholds for batch dispatch.
+    
+    - sync_max_latency_ms: requests with a latency budget at or below this use the realtime API
+    - batch_window_ms: how long to collect requests before submitting a batch
+    - batch_min_size: batches smaller than this at window close are sent via the realtime API
+    - batch_max_size: a batch is submitted immediately once it reaches this size
+    - poll_interval_s: how often to poll a submitted batch for completion
+    """
+    sync_max_latency_ms: int = int(os.getenv("ANTHROPIC_SYNC_MAX_LATENCY_MS", "5000"))
+    batch_window_ms: int = int(os.getenv("ANTHROPIC_BATCH_WINDOW_MS", "30000"))
+    batch_min_size: int = int(os.getenv("ANTHROPIC_BATCH_MIN_SIZE", "10"))
+    batch_max_size: int = int(os.getenv("ANTHROPIC_BATCH_MAX_SIZE", "100"))
+    poll_interval_s: float = float(os.getenv("ANTHROPIC_BATCH_POLL_INTERVAL", "10"))
+    
+    def should_batch(self, latency_budget_ms: Optional[float]) -> bool:
+        """Check if a request with the given latency budget can go through the Batch API."""
+        return latency_budget_ms is not None and latency_budget_ms > self.sync_max_latency_ms
+
+
+DEFAULT_ROUTING_POLICY = RoutingPolicy()
+
+
+class _PendingRequest:
+    __slots__ = ("custom_id", "params", "config", "future")
+    
+    def __init__(self, custom_id: str, params: Dict, config: Optional[Dict], future: asyncio.Future):
+        self.custom_id = custom_id
+        self.params = params
+        self.config = config
+        self.future = future
+
+
+class AnthropicBatchDispatcher:
+    """
+    Collects Messages API requests per model and submits them as Message Batches.
+    Each caller awaits a future that is resolved when its batch result is available.
+    """
+    
+    def __init__(self, api_key: str, policy: RoutingPolicy = DEFAULT_ROUTING_POLICY):
+        # Retries are handled by retry_transient so they aren't compounded with the SDK's
+        self.client = AsyncAnthropic(api_key=api_key, max_retries=0)
+        self.api_key = api_key
+        self.policy = policy
+        self._queues: Dict[str, List[_PendingRequest]] = {}
+        self._window_started: Dict[str, float] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self._ids = itertools.count()
+    
+    async def submit(self, params: Dict, config: Optional[Dict] = None) -> str:
+        """
+        Queue a Messages API request for batch processing.
+        
+        Args:
+            params: messages.create parameters (model, max_tokens, system, messages, ...)
+            config: Provider config (rpm / tpm / max_concurrency overrides) for the shared
+                throttle, used if the request falls back to the realtime API
+        
+        Returns:
+            Generated response text
+        """
+        model = params["model"]
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(model, [])
+        if not queue:
+            self._window_started[model] = time.monotonic()
+        queue.append(_PendingRequest(f"req-{next(self._ids)}", params, config, future))
+        
+        if len(queue) >= self.policy.batch_max_size:
+            self._dispatch(model)
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        
+        return await future
+    
+    async def _flush_loop(self):
+        """Submit queued requests once their batch window has elapsed."""
+        window_s = self.policy.batch_window_ms / 1000
+        while self._queues:
+            now = time.monotonic()
+            next_deadline = None
+            for model in list(self._queues):
+                deadline = self._window_started[model] + window_s
+                if deadline <= now:
+                    self._dispatch(model)
+                elif next_deadline is None or deadline < next_deadline:
+                    next_deadline = deadline
+            if next_deadline is None:
+                break
+            await asyncio.sleep(next_deadline - now)
+    
+    def _dispatch(self, model: str):
+        """Take the queue for a model and process it in the background."""
+        requests = self._queues.pop(model, [])
+        self._window_started.pop(model, None)
+        if not requests:
+            return
+        if len(requests) < self.policy.batch_min_size:
+            # Too small to be worth the batch turnaround - use the realtime API
+            for request in requests:
+                self._spawn(self._run_realtime(request))
+        else:
+            self._spawn(self._run_batch(requests))
+    
+    def _spawn(self, coro):
+        # Keep a reference so background tasks aren't garbage collected mid-flight
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run_realtime(self, request: _PendingRequest):
+        # Same throttle and retry/backoff path as AnthropicProvider's direct calls
+        params = request.params
+        throttle = get_throttle("anthropic", self.api_key, request.config)
+        prompt = "".join(
+            message["content"] for message in params["messages"] if isinstance(message.get("content"), str)
+        )
+        estimated_tokens = estimate_tokens(prompt, params.get("system"), params.get("max_tokens", 0))
+        
+        async def _create():
+            async with throttle.limit(estimated_tokens):
+                return await self.client.messages.create(**params)
+        
+        try:
+            response = await retry_transient(_create)
+            if not request.future.done():
+                request.future.set_result(_extract_text(response))
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+    
+    async def _run_batch(self, requests: List[_PendingRequest]):
+        pending = {request.custom_id: request for request in requests}
+        try:
+            batch = await retry_transient(lambda: self.client.messages.batches.create(
+                requests=[{"custom_id": r.custom_id, "params": r.params} for r in requests]
+            ))
+            logger.info(f"[Anthropic Batch] Submitted batch {batch.id} with {len(requests)} requests")
+            
+            while batch.processing_status != "ended":
+                await asyncio.sleep(self.policy.poll_interval_s)
+                batch = await retry_transient(lambda: self.client.messages.batches.retrieve(batch.id))
+            
+            async for entry in await self.client.messages.batches.results(batch.id):
+                request = pending.pop(entry.custom_id, None)
+                if request is None or request.future.done():
+                    continue
+                if entry.result.type == "succeeded":
+                    request.future.set_result(_extract_text(entry.result.message))
+                else:
+                    request.future.set_exception(
+                        Exception(f"Anthropic batch request {entry.result.type}")
+                    )
+            logger.info(f"[Anthropic Batch] Batch {batch.id} completed")
+        except Exception as e:
+            logger.error(f"[Anthropic Batch] Batch processing failed: {e}", exc_info=True)
+            for request in pending.values():
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        
+        for request in pending.values():
+            if not request.future.done():
+                request.future.set_exception(Exception("Anthropic batch returned no result"))
+
+
+def _extract_text(message) -> str:
+    if message.content and len(message.content) > 0:
+        return message.content[0].text
+    return ""
+
+
+_dispatchers: Dict[str, AnthropicBatchDispatcher] = {}
+
+
+def get_batch_dispatcher(api_key: str) -> AnthropicBatchDispatcher:
+    """Get the shared batch dispatcher for an API key."""
+    dispatcher = _dispatchers.get(api_key)
+    if dispatcher is None:
+        dispatcher = AnthropicBatchDispatcher(api_key)
+        _dispatchers[api_key] = dispatcher
+    return dispatcher
@@ -0,0 +1,206 @@
+"""
+Response cache for LLM providers.
+Caches generated responses keyed by (provider, model, system prompt, prompt, sampling params)
+so repeated deterministic requests skip the network round-trip and token cost.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+# orjson is optional - stdlib json is used if not available
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+# Redis is optional - in-memory cache is used if not available
+REDIS_AVAILABLE = False
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    pass
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_SIZE = int(os.getenv("LLM_CACHE_MAX_SIZE", "1024"))
+# Cache non-deterministic (temperature > 0) responses too when enabled
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL")
+# Temperatures at or below this are treated as greedy decoding
+DETERMINISTIC_TEMPERATURE = 1e-6
+
+
+class CacheBackend(Protocol):
+    """Storage backend for cached responses."""
+
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        ...
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_size: int = LLM_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class RedisCacheBackend:
+    """Redis-backed cache, shared across workers."""
+
+    def __init__(self, url: str, prefix: str = "llm_cache:"):
+        self.client = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        await self.client.set(self.prefix + key, value, ex=ttl)
+
+
+def _create_backend() -> CacheBackend:
+    if REDIS_URL and REDIS_AVAILABLE:
+        try:
+            return RedisCacheBackend(REDIS_URL)
+        except Exception as e:
+            logger.warning(f"[LLM Cache] Redis unavailable, using in-memory cache: {e}")
+    return MemoryCacheBackend()
+
+
+_backend: CacheBackend = _create_backend()
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """Get cache hit/miss counters."""
+    return dict(_stats)
+
+
+def canonical_json(obj) -> bytes:
+    """Serialize to canonical (key-sorted) JSON bytes, non-JSON values stringified."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, default=str).encode()
+
+
+def make_cache_key(
+    provider: str,
+    model: Optional[str],
+    system_prompt: Optional[str],
+    prompt: str,
+    temperature: Optional[float],
+    max_tokens: Optional[int] = None,
+    top_p: Optional[float] = None
+) -> str:
+    """
+    Build a deterministic cache key for a generation request.
+    
+    Returns:
+        128-bit BLAKE2b hex digest of the canonical request
+    """
+    payload = canonical_json({
+        "provider": provider,
+        "model": model,
+        "system": system_prompt,
+        "prompt": prompt,
+        "temp": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+    })
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def cached_response(func):
+    """
+    Cache the result of an LLMProvider.generate_response implementation.
+    
+    Responses are cached only when the request is deterministic (temperature ~ 0),
+    or when caching is enabled via LLM_CACHE_ENABLED / config["cache_enabled"].
+    Near-duplicate questions are handled one level up, by the AI response cache
+    (app/services/semantic_cache.py), which is keyed on the question itself.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, prompt: str, system_prompt: Optional[str] = None, config: Optional[Dict] = None):
+        merged_config = self._merge_config(config)
+        temperature = merged_config.get("temperature")
+        exact_enabled = merged_config.get("cache_enabled", LLM_CACHE_ENABLED) or (
+            temperature is not None and temperature <= DETERMINISTIC_TEMPERATURE
+        )
+        if not exact_enabled:
+            return await func(self, prompt, system_prompt, config)
+        
+        model = merged_config.get("model")
+        if model is None and hasattr(self, "get_active_model"):
+            model = self.get_active_model()
+        resolved_system_prompt = system_prompt or merged_config.get("system_prompt")
+        
+        key = make_cache_key(
+            self.get_provider_name(),
+            model,
+            resolved_system_prompt,
+            prompt,
+            temperature,
+            merged_config.get("max_tokens"),
+            merged_config.get("top_p")
+        )
+        
+        try:
+            cached = await _backend.get(key)
+        except Exception as e:
+            _stats["errors"] += 1
+            logger.warning(f"[LLM Cache] Lookup failed: {e}")
+            cached = None
+        
+        if cached is not None:
+            _stats["hits"] += 1
+            logger.debug(f"[LLM Cache] Hit - Provider: {self.get_provider_name()}")
+            return cached
+        
+        _stats["misses"] += 1
+        
+        response = await func(self, prompt, system_prompt, config)
+        
+        if response:
+            try:
+                await _backend.set(key, response, int(merged_config.get("cache_ttl", LLM_CACHE_TTL)))
+            except Exception as e:
+                _stats["errors"] += 1
+                logger.warning(f"[LLM Cache] Store failed: {e}")
+        
+        return response
+    
+    return wrapper
@@ -2,9 +2,14 @@
 Encryption utility for LLM API keys.
 Uses Fernet symmetric encryption to secure API keys in database.
 """
+import logging
 import os
-from cryptography.fernet import Fernet
-from typing import Optional
+import time
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
 
 # Get encryption key from environment variable
 _encryption_key = os.getenv("LLM_ENCRYPTION_KEY")
@@ -16,15 +21,64 @@ if not _encryption_key:
         raise ValueError("LLM_ENCRYPTION_KEY environment variable must be set in production")
     # For development, generate a temporary key (will be different each time)
     _encryption_key = Fernet.generate_key().decode()
-    print("⚠️  WARNING: LLM_ENCRYPTION_KEY not set. Generated temporary key for development only.")
+    logger.warning("LLM_ENCRYPTION_KEY not set. Generated temporary key for development only.")
 
 ENCRYPTION_KEY = _encryption_key
 
+# Previous keys (comma-separated) still accepted for decryption during key rotation
+_old_encryption_keys = [k.strip() for k in os.getenv("LLM_ENCRYPTION_OLD_KEYS", "").split(",") if k.strip()]
+
+
+def _build_fernet() -> Union[Fernet, MultiFernet]:
+    """Build the cipher once - Fernet key parsing is not free."""
+    ciphers = [
+        Fernet(key.encode() if isinstance(key, str) else key)
+        for key in [ENCRYPTION_KEY, *_old_encryption_keys]
+    ]
+    # MultiFernet encrypts with the first key and decrypts with any of them
+    return ciphers[0] if len(ciphers) == 1 else MultiFernet(ciphers)
+
 
-def get_fernet() -> Fernet:
+_FERNET = _build_fernet()
+
+
+def get_fernet() -> Union[Fernet, MultiFernet]:
     """Get Fernet cipher instance."""
-    key = ENCRYPTION_KEY.encode() if isinstance(ENCRYPTION_KEY, str) else ENCRYPTION_KEY
-    return Fernet(key)
+    return _FERNET
+
+
+# Marks values encrypted by this module (versioned so the format can change later)
+ENCRYPTED_PREFIX = "enc:v1:"
+
+
+def is_encrypted(value: str) -> bool:
+    """Check if a stored value carries the encryption marker."""
+    return value.startswith(ENCRYPTED_PREFIX)
+
+
+def _decrypt_token(f: Union[Fernet, MultiFernet], value: str) -> str:
+    # Unprefixed values are legacy tokens stored before the marker was introduced
+    token = value[len(ENCRYPTED_PREFIX):] if is_encrypted(value) else value
+    return f.decrypt(token.encode()).decode()
+
+
+@lru_cache(maxsize=1024)
+def _decrypt_token_cached(value: str) -> str:
+    """
+    Decrypt a stored token, memoized on the ciphertext itself.
+    A changed config has a new ciphertext, so entries never go stale; failures raise
+    and are therefore not cached.
+    """
+    return _decrypt_token(get_fernet(), value)
+
+
+def _wrap_legacy_token(value: str) -> Optional[str]:
+    """Return the prefixed form of a legacy Fernet token, or None if value isn't one."""
+    try:
+        get_fernet().decrypt(value.encode())
+    except Exception:
+        return None
+    return ENCRYPTED_PREFIX + value
 
 
 def encrypt_api_key(api_key: str) -> str:
@@ -43,9 +97,9 @@ def encrypt_api_key(api_key: str) -> str:
     try:
         f = get_fernet()
         encrypted = f.encrypt(api_key.encode())
-        return encrypted.decode()
+        return ENCRYPTED_PREFIX + encrypted.decode()
     except Exception as e:
-        print(f"Error encrypting API key: {e}")
+        logger.exception("Error encrypting API key")
         raise ValueError(f"Failed to encrypt API key: {e}")
 
 
@@ -63,15 +117,59 @@ def decrypt_api_key(encrypted_key: str) -> str:
         return ""
     
     try:
-        f = get_fernet()
-        decrypted = f.decrypt(encrypted_key.encode())
-        return decrypted.decode()
+        return _decrypt_token(get_fernet(), encrypted_key)
     except Exception as e:
-        print(f"Error decrypting API key: {e}")
+        logger.warning("Error decrypting API key: %s", e)
         # If decryption fails, return empty string (key may be unencrypted from old data)
         return ""
 
 
+def encrypt_api_keys_batch(api_keys: List[str]) -> List[str]:
+    """
+    Encrypt multiple API keys with a single cipher and timestamp.
+    
+    Args:
+        api_keys: Plain text API keys
+    
+    Returns:
+        Encrypted API keys (empty strings stay empty)
+    """
+    f = get_fernet()
+    now = int(time.time())
+    try:
+        return [
+            ENCRYPTED_PREFIX + f.encrypt_at_time(key.encode(), now).decode() if key else ""
+            for key in api_keys
+        ]
+    except Exception as e:
+        logger.exception("Error encrypting API keys")
+        raise ValueError(f"Failed to encrypt API keys: {e}")
+
+
+def decrypt_api_keys_batch(encrypted_keys: List[str]) -> List[str]:
+    """
+    Decrypt multiple API keys with a single cipher.
+    
+    Args:
+        encrypted_keys: Encrypted API key strings
+    
+    Returns:
+        Decrypted API keys (empty string for keys that fail to decrypt)
+    """
+    f = get_fernet()
+    decrypted = []
+    for key in encrypted_keys:
+        if not key:
+            decrypted.append("")
+            continue
+        try:
+            decrypted.append(_decrypt_token(f, key))
+        except Exception as e:
+            logger.warning("Error decrypting API key: %s", e)
+            decrypted.append("")
+    return decrypted
+
+
 def encrypt_llm_config(config: dict) -> dict:
     """
     Encrypt API keys in LLM configuration dictionary.
@@ -87,11 +185,11 @@ def encrypt_llm_config(config: dict) -> dict:
     
     encrypted_config = config.copy()
     
-    # Encrypt api_key if present
-    if "api_key" in encrypted_config and encrypted_config["api_key"]:
-        # Check if already encrypted (starts with 'gAAAAAB' for Fernet)
-        if not encrypted_config["api_key"].startswith("gAAAAAB"):
-            encrypted_config["api_key"] = encrypt_api_key(encrypted_config["api_key"])
+    # Encrypt api_key if present and not already encrypted
+    api_key = encrypted_config.get("api_key")
+    if api_key and not is_encrypted(api_key):
+        # Legacy tokens are re-marked rather than encrypted twice
+        encrypted_config["api_key"] = _wrap_legacy_token(api_key) or encrypt_api_key(api_key)
     
     return encrypted_config
 
@@ -111,9 +209,62 @@ def decrypt_llm_config(config: dict) -> dict:
     
     decrypted_config = config.copy()
     
-    # Decrypt api_key if present
+    # Decrypt api_key if present (cached: this runs on every chat turn)
     if "api_key" in decrypted_config and decrypted_config["api_key"]:
-        decrypted_config["api_key"] = decrypt_api_key(decrypted_config["api_key"])
+        try:
+            decrypted_config["api_key"] = _decrypt_token_cached(decrypted_config["api_key"])
+        except Exception as e:
+            logger.warning("Error decrypting API key: %s", e)
+            decrypted_config["api_key"] = ""
     
     return decrypted_config
 
+
+def needs_key_migration(config: dict) -> bool:
+    """
+    Check if a stored config holds a legacy (unmarked) encrypted API key.
+    Callers rewrite it with encrypt_llm_config() after the first successful decrypt.
+    """
+    return bool(config and config.get("api_key") and not is_encrypted(config["api_key"]))
+
+
+def encrypt_llm_configs(configs: List[dict]) -> List[dict]:
+    """
+    Encrypt API keys across multiple LLM configuration dictionaries in one pass.
+    
+    Args:
+        configs: LLM configuration dictionaries that may contain 'api_key'
+    
+    Returns:
+        Configuration dictionaries with encrypted API keys
+    """
+    encrypted_configs = [config.copy() if config else config for config in configs]
+    targets = []
+    for config in encrypted_configs:
+        if not config or not config.get("api_key") or is_encrypted(config["api_key"]):
+            continue
+        legacy = _wrap_legacy_token(config["api_key"])
+        if legacy:
+            config["api_key"] = legacy
+        else:
+            targets.append(config)
+    for config, encrypted in zip(targets, encrypt_api_keys_batch([c["api_key"] for c in targets])):
+        config["api_key"] = encrypted
+    return encrypted_configs
+
+
+def decrypt_llm_configs(configs: List[dict]) -> List[dict]:
+    """
+    Decrypt API keys across multiple LLM configuration dictionaries in one pass.
+    
+    Args:
+        configs: LLM configuration dictionaries with encrypted 'api_key'
+    
+    Returns:
+        Configuration dictionaries with decrypted API keys
+    """
+    decrypted_configs = [config.copy() if config else config for config in configs]
+    targets = [config for config in decrypted_configs if config and config.get("api_key")]
+    for config, decrypted in zip(targets, decrypt_api_keys_batch([c["api_key"] for c in targets])):
+        config["api_key"] = decrypted
+    return decrypted_configs
@@ -0,0 +1,88 @@
+"""
+Client-side pooling across multiple inference endpoints / API keys.
+Spreads requests over endpoints by current load and skips endpoints cooling down
+after a rate limit or server error, so throughput scales with the number of keys.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+
+ENDPOINT_COOLDOWN_SECONDS = float(os.getenv("ENDPOINT_COOLDOWN_SECONDS", "30"))
+
+
+class PooledEndpoint:
+    """One API key / base URL pair with its client and load state."""
+    
+    def __init__(self, client, api_key: Optional[str], base_url: Optional[str], concurrency_limit: int = 0):
+        self.client = client
+        self.api_key = api_key
+        self.base_url = base_url
+        self.concurrency_limit = concurrency_limit
+        self.semaphore = asyncio.Semaphore(concurrency_limit) if concurrency_limit > 0 else None
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+    
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.concurrency_limit if self.concurrency_limit else float(self.in_flight)
+
+
+class EndpointPool:
+    """
+    Balances requests across endpoints.
+    Picks the least-loaded endpoint that is not cooling down; if every endpoint is
+    cooling down, the one that recovers first is used.
+    """
+    
+    def __init__(
+        self,
+        endpoints: List[Dict],
+        client_factory: Callable[[Optional[str], Optional[str]], object],
+        cooldown_seconds: float = ENDPOINT_COOLDOWN_SECONDS
+    ):
+        """
+        Args:
+            endpoints: List of {"api_key", "base_url", "concurrency_limit"} dicts
+            client_factory: Builds (or returns a shared) client for (api_key, base_url)
+            cooldown_seconds: How long to avoid an endpoint after a transient error
+        """
+        self.cooldown_seconds = cooldown_seconds
+        self.endpoints = [
+            PooledEndpoint(
+                client_factory(endpoint.get("api_key"), endpoint.get("base_url")),
+                endpoint.get("api_key"),
+                endpoint.get("base_url"),
+                int(endpoint.get("concurrency_limit") or 0)
+            )
+            for endpoint in endpoints
+        ]
+    
+    def __len__(self) -> int:
+        return len(self.endpoints)
+    
+    def _select(self) -> PooledEndpoint:
+        now = time.monotonic()
+        ready = [endpoint for endpoint in self.endpoints if endpoint.cooldown_until <= now]
+        if not ready:
+            return min(self.endpoints, key=lambda endpoint: endpoint.cooldown_until)
+        return min(ready, key=lambda endpoint: endpoint.load)
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Reserve an endpoint for one request."""
+        endpoint = self._select()
+        endpoint.in_flight += 1
+        try:
+            if endpoint.semaphore:
+                async with endpoint.semaphore:
+                    yield endpoint
+            else:
+                yield endpoint
+        finally:
+            endpoint.in_flight -= 1
+    
+    def cool_down(self, endpoint: PooledEndpoint):
+        """Route traffic away from an endpoint that was rate limited or failing."""
+        endpoint.cooldown_until = time.monotonic() + self.cooldown_seconds
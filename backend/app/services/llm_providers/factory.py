@@ -2,18 +2,26 @@
 LLM Provider Factory.
 Creates and manages LLM provider instances.
 """
+import functools
 import logging
-from typing import TYPE_CHECKING, Dict, Optional
+import re
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, Mapping, Optional, Tuple
+
+from app.services.llm_providers.cache import canonical_json
 
 if TYPE_CHECKING:
     from app.services.llm_providers.base import LLMProvider
 
 logger = logging.getLogger(__name__)
 
-# Registry of available providers - lazy loaded to avoid circular imports
-_PROVIDER_REGISTRY: Dict[str, type] = {}
-
-
+# Cache of available provider instances keyed by (provider name, canonical config),
+# so warm clients and connection pools are reused across requests
+_PROVIDER_CACHE_SIZE = 64
+_provider_cache: "OrderedDict[Tuple[str, bytes], LLMProvider]" = OrderedDict()
+_provider_cache_lock = threading.Lock()
 
 
 # Provider metadata with detailed information
@@ -81,48 +89,81 @@ PROVIDER_METADATA = {
 }
 
 
-def get_provider_metadata(provider_name: str) -> Optional[Dict]:
+# Read-only views handed out by get_provider_metadata (no per-call copy)
+_FROZEN_METADATA: Dict[str, Mapping] = {
+    name: MappingProxyType(meta) for name, meta in PROVIDER_METADATA.items()
+}
+
+# API key validators compiled once at import
+_VALIDATORS: Dict[str, "re.Pattern"] = {
+    name: re.compile(meta["validation_regex"])
+    for name, meta in PROVIDER_METADATA.items()
+    if "validation_regex" in meta
+}
+
+
+def validate_api_key(provider_name: str, api_key: str) -> bool:
     """
-    Get metadata for a provider.
+    Check an API key against the provider's expected format.
     
     Args:
         provider_name: Name of the provider
+        api_key: API key to validate
         
     Returns:
-        Provider metadata dict or None if not found
+        True if the key matches (or the provider has no format rule), False otherwise
     """
-    provider_lower = provider_name.lower()
-    if provider_lower not in PROVIDER_METADATA:
-        return None
-    
-    metadata = PROVIDER_METADATA[provider_lower].copy()
-    return metadata
+    validator = _VALIDATORS.get(provider_name.lower())
+    if validator is None:
+        return True
+    return bool(api_key) and validator.match(api_key) is not None
 
 
-def _load_providers():
-    """Lazy load providers to avoid circular imports."""
-    if not _PROVIDER_REGISTRY:
-        # Load HuggingFace Inference API provider (serverless, requires API key)
-        try:
-            from app.services.llm_providers.huggingface_inference_provider import (
-                HuggingFaceInferenceProvider,
-            )
-            _PROVIDER_REGISTRY["huggingface_inference"] = HuggingFaceInferenceProvider
-        except ImportError:
-            pass
-        
-        # Load cloud providers (paid options)
-        try:
-            from app.services.llm_providers.openai_provider import OpenAIProvider
-            _PROVIDER_REGISTRY["openai"] = OpenAIProvider
-        except ImportError:
-            pass
+def get_provider_metadata(provider_name: str) -> Optional[Mapping]:
+    """
+    Get metadata for a provider.
+    
+    Args:
+        provider_name: Name of the provider
         
-        try:
-            from app.services.llm_providers.anthropic_provider import AnthropicProvider
-            _PROVIDER_REGISTRY["anthropic"] = AnthropicProvider
-        except ImportError:
-            pass
+    Returns:
+        Read-only provider metadata mapping or None if not found.
+        Callers that need to modify it should take a copy with dict().
+    """
+    return _FROZEN_METADATA.get(provider_name.lower())
+
+
+@functools.cache
+def _registry() -> Dict[str, type]:
+    """
+    Registry of available providers.
+    Imported once on first use (warmed at application startup) - deferred to avoid circular imports.
+    """
+    registry: Dict[str, type] = {}
+    
+    # Load HuggingFace Inference API provider (serverless, requires API key)
+    try:
+        from app.services.llm_providers.huggingface_inference_provider import (
+            HuggingFaceInferenceProvider,
+        )
+        registry["huggingface_inference"] = HuggingFaceInferenceProvider
+    except ImportError:
+        pass
+    
+    # Load cloud providers (paid options)
+    try:
+        from app.services.llm_providers.openai_provider import OpenAIProvider
+        registry["openai"] = OpenAIProvider
+    except ImportError:
+        pass
+    
+    try:
+        from app.services.llm_providers.anthropic_provider import AnthropicProvider
+        registry["anthropic"] = AnthropicProvider
+    except ImportError:
+        pass
+    
+    return registry
 
 
 def get_provider(provider_name: str, config: Optional[Dict] = None) -> Optional["LLMProvider"]:
@@ -136,9 +177,15 @@ def get_provider(provider_name: str, config: Optional[Dict] = None) -> Optional[
     Returns:
         LLMProvider instance or None if provider not found
     """
-    _load_providers()
     provider_name_lower = provider_name.lower()
-    provider_class = _PROVIDER_REGISTRY.get(provider_name_lower)
+    cache_key = (provider_name_lower, canonical_json(config or {}))
+    with _provider_cache_lock:
+        provider = _provider_cache.get(cache_key)
+        if provider is not None:
+            _provider_cache.move_to_end(cache_key)
+            return provider
+    
+    provider_class = _registry().get(provider_name_lower)
     
     # Extract model name from config for logging
     model_name = None
@@ -153,7 +200,7 @@ def get_provider(provider_name: str, config: Optional[Dict] = None) -> Optional[
     if not provider_class:
         logger.warning(
             f"[Provider Factory] Provider not found in registry - Provider: {provider_name}, "
-            f"Available Providers: {list(_PROVIDER_REGISTRY.keys())}"
+            f"Available Providers: {list(_registry().keys())}"
         )
         return None
     
@@ -175,6 +222,10 @@ def get_provider(provider_name: str, config: Optional[Dict] = None) -> Optional[
                 f"[Provider Factory] Provider created successfully - Provider: {provider_name}, "
                 f"Model: {provider_model}, Available: True"
             )
+            with _provider_cache_lock:
+                _provider_cache[cache_key] = provider
+                while len(_provider_cache) > _PROVIDER_CACHE_SIZE:
+                    _provider_cache.popitem(last=False)
             return provider
         else:
             logger.warning(
@@ -191,6 +242,22 @@ def get_provider(provider_name: str, config: Optional[Dict] = None) -> Optional[
         return None
 
 
+def invalidate(provider_name: Optional[str] = None):
+    """
+    Drop cached provider instances, e.g. after an API key rotation.
+    
+    Args:
+        provider_name: Provider to invalidate. If None, clears all providers.
+    """
+    with _provider_cache_lock:
+        if provider_name is None:
+            _provider_cache.clear()
+            return
+        provider_name_lower = provider_name.lower()
+        for key in [key for key in _provider_cache if key[0] == provider_name_lower]:
+            del _provider_cache[key]
+
+
 def list_available_providers() -> list[str]:
     """
     List all registered provider names.
@@ -198,8 +265,7 @@ def list_available_providers() -> list[str]:
     Returns:
         List of provider names
     """
-    _load_providers()
-    return list(_PROVIDER_REGISTRY.keys())
+    return list(_registry().keys())
 
 
 def register_provider(name: str, provider_class: type):
@@ -210,5 +276,5 @@ def register_provider(name: str, provider_class: type):
         name: Provider name
         provider_class: Provider class that implements LLMProvider
     """
-    _PROVIDER_REGISTRY[name.lower()] = provider_class
+    _registry()[name.lower()] = provider_class
 
@@ -3,22 +3,343 @@ HuggingFace Inference API Provider.
 Uses HuggingFace Inference API for serverless LLM inference.
 API key required - get free token at https://huggingface.co/settings/tokens
 """
+import asyncio
+import functools
+import hashlib
 import logging
 import os
-from typing import Dict, Optional
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
 
 from app.services.llm_providers.base import LLMProvider
+from app.services.llm_providers.cache import cached_response
+from app.services.llm_providers.endpoint_pool import EndpointPool
+from app.services.llm_providers.retry import is_transient_error, retry_transient
+from app.services.llm_providers.throttle import estimate_tokens, get_throttle
+from app.services.llm_providers.token_limits import DEFAULT_MAX_INPUT_TOKENS, check_prompt_size
 
 logger = logging.getLogger(__name__)
 
 # HuggingFace Inference API will be optional
 HF_INFERENCE_AVAILABLE = False
 try:
-    from huggingface_hub import InferenceClient
+    from huggingface_hub import AsyncInferenceClient
     HF_INFERENCE_AVAILABLE = True
 except ImportError:
     pass
 
+# huggingface_hub < 1.0 runs AsyncInferenceClient on aiohttp (no way to supply a transport);
+# >= 1.0 runs it on httpx and takes the client from set_async_client_factory
+HTTP_CLIENT_FACTORY_AVAILABLE = False
+try:
+    import httpx
+    from huggingface_hub import set_async_client_factory
+    HTTP_CLIENT_FACTORY_AVAILABLE = True
+except ImportError:
+    pass
+
+# huggingface_hub's own httpx event hooks (request headers, error body reads) are private;
+# if they move, the pooled client is still used, just without them
+_HF_EVENT_HOOKS: Dict[str, list] = {}
+try:
+    from huggingface_hub.utils._http import async_hf_request_event_hook, async_hf_response_event_hook
+    _HF_EVENT_HOOKS = {"request": [async_hf_request_event_hook], "response": [async_hf_response_event_hook]}
+except ImportError:
+    pass
+
+# HTTP/2 needs the optional h2 package
+H2_AVAILABLE = False
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    pass
+
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+# Instruction-tuned models typically carry one of these markers in their name
+_INSTRUCT_RE = re.compile(r"instruct|chat|-it|it-", re.IGNORECASE)
+
+# API error classification, one named group per kind (single pass over the message)
+_ERROR_RE = re.compile(
+    r"(?P<loading>503|loading)"
+    r"|(?P<rate_limit>429|rate limit)"
+    r"|(?P<auth>401|unauthorized|invalid token|authentication)"
+    r"|(?P<not_found>404|not found|does not exist)"
+    r"|(?P<unsupported>not supported|unsupported)",
+    re.IGNORECASE
+)
+# When several kinds match, the first in this order wins
+_ERROR_PRIORITY = ("loading", "rate_limit", "auth", "not_found", "unsupported")
+_ERROR_MESSAGES = {
+    "loading": (
+        "Model {model} is currently loading. Please wait 30-60 seconds and try again. "
+        "This is normal for models that haven't been used recently."
+    ),
+    "rate_limit": (
+        "Rate limit reached. Your API key credits may be exhausted. "
+        "Check your usage at https://huggingface.co/settings/billing. "
+        "Free tier: $0.10/month, PRO: $2.00/month"
+    ),
+    "auth": (
+        "Invalid or missing API key. Please check your HuggingFace API key. "
+        "Make sure you've set HF_TOKEN or HUGGINGFACE_API_KEY environment variable, "
+        "or provided it in the config. Get a token at https://huggingface.co/settings/tokens"
+    ),
+    "not_found": "Model {model} not found. Check the model ID at https://huggingface.co/models",
+    # This error might be misleading - show the actual error message
+    "unsupported": (
+        "API error for model {model}: {error_msg}. "
+        "This might indicate the model requires a different API method or your API key doesn't have access. "
+        "Check the model page at https://huggingface.co/{model} and verify your API key at https://huggingface.co/settings/tokens"
+    ),
+    # Return full error message for debugging - don't hide the actual error
+    None: "HuggingFace Inference API error for {model} ({error_type}): {error_msg}",
+}
+
+HF_INFERENCE_TIMEOUT = float(os.getenv("HF_INFERENCE_TIMEOUT", "60"))
+# Matches the factory's provider cache, so cached providers rarely see their client evicted
+HF_INFERENCE_CLIENT_CACHE_SIZE = 64
+# Evicted clients are closed after this long, so requests already using them can finish
+HF_CLIENT_CLOSE_GRACE = float(os.getenv("HF_CLIENT_CLOSE_GRACE", "300"))
+# Serverless cold loads typically finish within a minute; keep retrying warmup this long
+HF_WARMUP_TIMEOUT = float(os.getenv("HF_WARMUP_TIMEOUT", "120"))
+
+# Shared clients keyed by (token, base_url), least recently used first
+_inference_clients: "OrderedDict[Tuple[Optional[str], Optional[str]], object]" = OrderedDict()
+# Shared endpoint pools keyed by their endpoint list, so cool-down state outlives providers
+_endpoint_pools: Dict[Tuple, EndpointPool] = {}
+# Evicted clients waiting to be closed, and the tasks that will close them
+_retired_clients: list = []
+_close_tasks: set = set()
+
+
+def _build_async_http_client():
+    """
+    httpx client backing each AsyncInferenceClient: HTTP/2 (when h2 is installed) so
+    concurrent requests multiplex over one TLS connection, plus a keep-alive pool.
+    Keeps huggingface_hub's own request/response hooks when they can be imported.
+    """
+    return httpx.AsyncClient(
+        http2=H2_AVAILABLE,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        timeout=httpx.Timeout(HF_INFERENCE_TIMEOUT, connect=5.0),
+        follow_redirects=True,
+        event_hooks=_HF_EVENT_HOOKS,
+    )
+
+
+def configure_http_client() -> bool:
+    """
+    Register the pooled httpx client factory with huggingface_hub (called once on startup).
+    
+    The factory is process-wide: every huggingface_hub async client created afterwards uses it.
+    
+    Returns:
+        True if registered, False on huggingface_hub < 1.0 (aiohttp-based, nothing to configure)
+    """
+    if not HTTP_CLIENT_FACTORY_AVAILABLE:
+        return False
+    set_async_client_factory(_build_async_http_client)
+    return True
+
+
+def _get_inference_client(token: Optional[str] = None, base_url: Optional[str] = None):
+    """
+    Get a shared AsyncInferenceClient for a (token, base_url) pair.
+    
+    Clients are cached at module level (not on providers) to keep their HTTP session and
+    keep-alive connections warm across requests and provider instances. Providers look
+    their client up here on every call, so they never hold on to an evicted one.
+    At most HF_INFERENCE_CLIENT_CACHE_SIZE clients are kept; evicted clients are closed
+    after HF_CLIENT_CLOSE_GRACE seconds (see _retire_client).
+    """
+    key = (token, base_url)
+    client = _inference_clients.get(key)
+    if client is not None:
+        _inference_clients.move_to_end(key)
+        return client
+    
+    client_kwargs = {"timeout": HF_INFERENCE_TIMEOUT}
+    if token:
+        client_kwargs["token"] = token
+    if base_url:
+        client_kwargs["base_url"] = base_url
+    client = AsyncInferenceClient(**client_kwargs)
+    _inference_clients[key] = client
+    while len(_inference_clients) > HF_INFERENCE_CLIENT_CACHE_SIZE:
+        _, evicted = _inference_clients.popitem(last=False)
+        _retire_client(evicted)
+    return client
+
+
+def _retire_client(client) -> None:
+    """
+    Close an evicted client once in-flight requests on it have had time to finish.
+    Endpoint pools holding it are dropped so they are rebuilt with fresh clients.
+    """
+    for key, pool in list(_endpoint_pools.items()):
+        if any(endpoint.client is client for endpoint in pool.endpoints):
+            del _endpoint_pools[key]
+    
+    _retired_clients.append(client)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop (sync caller): close_inference_clients closes it on shutdown
+        return
+    
+    async def _close_later():
+        await asyncio.sleep(HF_CLIENT_CLOSE_GRACE)
+        if client in _retired_clients:
+            _retired_clients.remove(client)
+            await _close_client(client)
+    
+    task = loop.create_task(_close_later())
+    _close_tasks.add(task)
+    task.add_done_callback(_close_tasks.discard)
+
+
+async def _close_client(client) -> None:
+    close = getattr(client, "close", None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception as e:
+        logger.warning(f"[HuggingFace Inference] Error closing client: {e}")
+
+
+def _get_endpoint_pool(endpoints: list) -> EndpointPool:
+    """Get the shared pool for a list of endpoint configs."""
+    key = tuple(
+        (endpoint.get("api_key"), endpoint.get("base_url"), endpoint.get("concurrency_limit"))
+        for endpoint in endpoints
+    )
+    pool = _endpoint_pools.get(key)
+    if pool is None:
+        pool = EndpointPool(endpoints, _get_inference_client)
+        _endpoint_pools[key] = pool
+    return pool
+
+
+@functools.lru_cache(maxsize=256)
+def _is_instruction_model_cached(model: str) -> bool:
+    return _INSTRUCT_RE.search(model) is not None
+
+
+@functools.lru_cache(maxsize=256)
+def _is_qwen_model(model: str) -> bool:
+    return "qwen" in model.lower()
+
+
+@functools.lru_cache(maxsize=64)
+def _prefix_for(system_prompt: str, is_qwen: bool = False) -> Tuple[str, str]:
+    """
+    (head, tail) wrapped around the user prompt for text_generation, rendered once per
+    distinct system prompt. Qwen models take a plain "system\n\nprompt" layout.
+    """
+    if is_qwen:
+        return system_prompt + "\n\n", ""
+    return system_prompt + "\n\nUser: ", "\nAssistant:"
+
+
+@functools.lru_cache(maxsize=64)
+def _prompt_cache_key(system_prompt: str) -> str:
+    """Stable routing key so requests sharing a system prompt land on the same prefix-cache shard."""
+    return hashlib.blake2b(system_prompt.encode(), digest_size=16).hexdigest()
+
+
+def _prompt_cache_kwargs(merged_config: Dict, system_prompt: Optional[str]) -> Dict:
+    """
+    Extra chat_completion kwargs enabling provider-side prefix caching of the system prompt.
+    The system message itself is always sent byte-identical, so TGI/vLLM prefix caches hit
+    without any hint; OpenAI-compatible routers additionally use prompt_cache_key.
+    """
+    if not system_prompt or not merged_config.get("enable_prompt_cache", True):
+        return {}
+    return {"extra_body": {"prompt_cache_key": _prompt_cache_key(system_prompt)}}
+
+
+async def close_inference_clients():
+    """Close all cached and evicted inference clients (called on application shutdown)."""
+    for task in list(_close_tasks):
+        task.cancel()
+    clients = list(_inference_clients.values()) + _retired_clients
+    _inference_clients.clear()
+    _retired_clients.clear()
+    _endpoint_pools.clear()
+    for client in clients:
+        await _close_client(client)
+
+
+def _text_from_dict(response: Dict) -> Optional[str]:
+    choices = response.get("choices")
+    if choices:
+        choice = choices[0]
+        message = choice.get("message")
+        return message.get("content", "") if message else choice.get("text")
+    return response.get("generated_text") or response.get("text")
+
+
+def _text_from_list(response: list) -> Optional[str]:
+    return _text_from_dict(response[0]) if response else None
+
+
+# Raw response shapes, dispatched on exact type
+_EXTRACTORS = {
+    str: lambda response: response,
+    dict: _text_from_dict,
+    list: _text_from_list,
+}
+
+
+def _extract_text(response) -> str:
+    """Extract generated text from a chat_completion / text_generation response."""
+    extractor = _EXTRACTORS.get(type(response))
+    if extractor is not None:
+        text = extractor(response)
+    else:
+        # huggingface_hub output types (ChatCompletionOutput, TextGenerationOutput)
+        choices = getattr(response, "choices", None)
+        text = choices[0].message.content if choices else getattr(response, "generated_text", None)
+    # Fallback: stringify whatever came back
+    return str(response if text is None else text).strip()
+
+
+def _chat_text(response) -> str:
+    """Fast path for the documented ChatCompletionOutput; other shapes go through _extract_text."""
+    try:
+        return response.choices[0].message.content.strip()
+    except (AttributeError, IndexError, TypeError):
+        return _extract_text(response)
+
+
+def _generation_text(response) -> str:
+    """Fast path for text_generation's plain-string output."""
+    if type(response) is str:
+        return response.strip()
+    return _extract_text(response)
+
+
+def _sampling_kwargs(merged_config: Dict) -> Dict:
+    """
+    text_generation sampling params: sample only when temperature > 0, otherwise
+    greedy decoding (TGI also rejects temperature=0 with do_sample).
+    """
+    temperature = merged_config.get("temperature", 0.7)
+    if temperature > 0:
+        return {"do_sample": True, "temperature": temperature, "top_p": merged_config.get("top_p", 0.95)}
+    return {"do_sample": False}
+
+
+def _build_messages(system_prompt: Optional[str], prompt: str) -> list:
+    if system_prompt:
+        return [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+    return [{"role": "user", "content": prompt}]
+
 
 class HuggingFaceInferenceProvider(LLMProvider):
     """
@@ -35,6 +356,9 @@ class HuggingFaceInferenceProvider(LLMProvider):
                 - model: Model name (default: "mistralai/Mistral-7B-Instruct-v0.2")
                 - api_key: Optional HuggingFace API key (for private models or higher rate limits)
                 - base_url: Optional custom Inference API endpoint
+                - endpoints: Optional list of {"api_key", "base_url", "concurrency_limit"}
+                  to spread requests across multiple tokens/endpoints
+                - max_input_tokens: Reject prompts longer than this (default: LLM_MAX_INPUT_TOKENS or 8192)
         """
         self.config = config or {}
         self.model = self.config.get(
@@ -49,28 +373,97 @@ class HuggingFaceInferenceProvider(LLMProvider):
         )
         self.base_url = self.config.get("base_url") or os.getenv("HF_INFERENCE_BASE_URL")
         
-        self.client = None
-        if HF_INFERENCE_AVAILABLE:
-            try:
-                client_kwargs = {}
-                if self.api_key:
-                    client_kwargs["token"] = self.api_key
-                if self.base_url:
-                    client_kwargs["base_url"] = self.base_url
-                
-                self.client = InferenceClient(**client_kwargs)
-            except Exception as e:
-                print(f"Error initializing HuggingFace Inference client: {e}")
+        self.endpoints = self.config.get("endpoints") or []
+        if self.endpoints and not self.api_key:
+            self.api_key = self.endpoints[0].get("api_key")
+    
+    @property
+    def client(self):
+        """Shared client for the current API key (looked up per call; see _get_inference_client)."""
+        if not HF_INFERENCE_AVAILABLE:
+            return None
+        try:
+            return _get_inference_client(self.api_key, self.base_url)
+        except Exception as e:
+            logger.error("Error initializing HuggingFace Inference client: %s", e)
+            return None
+    
+    @property
+    def endpoint_pool(self) -> Optional[EndpointPool]:
+        """Shared pool for the configured endpoints (rebuilt if one of its clients was evicted)."""
+        if not HF_INFERENCE_AVAILABLE or not self.endpoints:
+            return None
+        return _get_endpoint_pool(self.endpoints)
     
     def _is_instruction_model(self, model: str) -> bool:
         """
         Detect if model is instruction-tuned based on model name.
         Instruction models typically have keywords like 'instruct', 'chat', '-it', 'it-'
         """
-        model_lower = model.lower()
-        instruction_keywords = ['instruct', 'chat', '-it', 'it-']
-        return any(keyword in model_lower for keyword in instruction_keywords)
+        return _is_instruction_model_cached(model)
+    
+    def _resolve_api_key(self, merged_config: Dict, model: str) -> str:
+        """
+        Resolve the API key for a request and point the client at it.
+        Raises if no API key is configured.
+        """
+        # Get API key from merged config (may override instance-level key)
+        api_key = merged_config.get("api_key") or self.api_key
+        if not api_key:
+            # Try environment variables again in case they were set after initialization
+            api_key = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_API_KEY")
+        
+        # Point the client at the new key (the client property looks it up by api_key)
+        if api_key and api_key != self.api_key:
+            self.api_key = api_key
+            logger.info(f"[HuggingFace Inference] Client switched to new API key")
+        
+        # Require API key for HuggingFace Inference API
+        if not api_key:
+            error_msg = (
+                "HuggingFace API key is required. "
+                "Get a free token at https://huggingface.co/settings/tokens "
+                "(free tier: $0.10/month credits, PRO: $2.00/month credits)"
+            )
+            logger.error(f"[HuggingFace Inference] API key missing for model: {model}")
+            raise Exception(error_msg)
+        
+        return api_key
+    
+    def _format_prompt(self, model: str, prompt: str, system_prompt: Optional[str]) -> str:
+        """Format system + user prompt for the text_generation API."""
+        if not system_prompt:
+            return prompt
+        head, tail = _prefix_for(system_prompt, _is_qwen_model(model))
+        return head + prompt + tail
+    
+    async def _call_api(self, method: str, api_key: str, merged_config: Dict, estimated_tokens: int, *args, **kwargs):
+        """
+        Call an AsyncInferenceClient method with throttling and transient-error retries.
+        With an endpoint pool, each attempt goes to the least-loaded healthy endpoint and
+        endpoints that hit rate limits / server errors are cooled down.
+        """
+        pool = self.endpoint_pool
+        client = self.client
+        
+        async def _attempt():
+            if pool is None:
+                async with get_throttle(self.get_provider_name(), api_key, merged_config).limit(estimated_tokens):
+                    return await getattr(client, method)(*args, **kwargs)
+            
+            async with pool.acquire() as endpoint:
+                throttle = get_throttle(self.get_provider_name(), endpoint.api_key, merged_config)
+                async with throttle.limit(estimated_tokens):
+                    try:
+                        return await getattr(endpoint.client, method)(*args, **kwargs)
+                    except Exception as e:
+                        if is_transient_error(e):
+                            pool.cool_down(endpoint)
+                        raise
+        
+        return await retry_transient(_attempt, retries=max(3, len(pool) if pool else 0))
     
+    @cached_response
     async def generate_response(
         self,
         prompt: str,
@@ -85,92 +478,54 @@ class HuggingFaceInferenceProvider(LLMProvider):
             raise Exception("HuggingFace Inference API is not available. Install huggingface_hub: pip install huggingface_hub")
         
         if not self.client:
-            raise Exception("HuggingFace InferenceClient not initialized. Install huggingface_hub: pip install huggingface_hub")
+            raise Exception("HuggingFace AsyncInferenceClient not initialized. Install huggingface_hub: pip install huggingface_hub")
         
         # Merge config
-        merged_config = {**self.config, **(config or {})}
+        merged_config = self._merge_config(config)
         model = merged_config.get("model", self.model)
-        system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
+        system_prompt = system_prompt or merged_config.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
         
         logger.info(
             f"[HuggingFace Inference] Generating response - Model: {model}, "
             f"Prompt Length: {len(prompt)}, Has System Prompt: {bool(system_prompt)}"
         )
         
-        # Get API key from merged config (may override instance-level key)
-        api_key = merged_config.get("api_key") or self.api_key
-        if not api_key:
-            # Try environment variables again in case they were set after initialization
-            api_key = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_API_KEY")
-        
-        # Re-initialize client if API key changed or client doesn't exist
-        if api_key and (not self.client or api_key != self.api_key):
-            try:
-                client_kwargs = {"token": api_key}
-                if self.base_url:
-                    client_kwargs["base_url"] = self.base_url
-                self.client = InferenceClient(**client_kwargs)
-                self.api_key = api_key
-                logger.info(f"[HuggingFace Inference] Client re-initialized with new API key")
-            except Exception as e:
-                logger.error(f"[HuggingFace Inference] Error re-initializing client: {e}")
-        
-        # Require API key for HuggingFace Inference API
-        if not api_key:
-            error_msg = (
-                "HuggingFace API key is required. "
-                "Get a free token at https://huggingface.co/settings/tokens "
-                "(free tier: $0.10/month credits, PRO: $2.00/month credits)"
-            )
-            logger.error(f"[HuggingFace Inference] API key missing for model: {model}")
-            raise Exception(error_msg)
+        api_key = self._resolve_api_key(merged_config, model)
+        await check_prompt_size(
+            model, prompt, system_prompt, merged_config.get("max_input_tokens", DEFAULT_MAX_INPUT_TOKENS)
+        )
         
         # Determine if this is an instruction-tuned model
         is_instruction = self._is_instruction_model(model)
         logger.debug(f"[HuggingFace Inference] Model type - Model: {model}, Is Instruction: {is_instruction}")
         
+        max_tokens = merged_config.get("max_tokens", 512)
+        temperature = merged_config.get("temperature", 0.7)
+        top_p = merged_config.get("top_p", 0.95)
+        estimated_tokens = estimate_tokens(prompt, system_prompt, max_tokens)
+        
         try:
             # For instruction-tuned models, try chat_completion API first
             # This is the recommended method for models like Qwen2.5-7B-Instruct
             if is_instruction:
                 try:
                     # Format messages for chat completion
-                    messages = []
-                    if system_prompt:
-                        messages.append({"role": "system", "content": system_prompt})
-                    messages.append({"role": "user", "content": prompt})
+                    messages = _build_messages(system_prompt, prompt)
                     
                     # Use chat_completion API for instruction models
-                    response = self.client.chat_completion(
+                    response = await self._call_api(
+                        "chat_completion",
+                        api_key,
+                        merged_config,
+                        estimated_tokens,
                         messages=messages,
                         model=model,
-                        max_tokens=merged_config.get("max_tokens", 512),
-                        temperature=merged_config.get("temperature", 0.7),
-                        top_p=merged_config.get("top_p", 0.95),
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        top_p=top_p,
+                        **_prompt_cache_kwargs(merged_config, system_prompt),
                     )
-                    
-                    # Handle chat completion response
-                    if isinstance(response, dict):
-                        if "choices" in response and len(response["choices"]) > 0:
-                            choice = response["choices"][0]
-                            if "message" in choice:
-                                content = choice["message"].get("content", "")
-                                return content.strip()
-                            elif "text" in choice:
-                                return str(choice["text"]).strip()
-                        elif "generated_text" in response:
-                            return str(response["generated_text"]).strip()
-                        elif "text" in response:
-                            return str(response["text"]).strip()
-                    elif hasattr(response, 'choices') and len(response.choices) > 0:
-                        choice = response.choices[0]
-                        if hasattr(choice, 'message') and hasattr(choice.message, 'content'):
-                            return str(choice.message.content).strip()
-                    elif isinstance(response, str):
-                        return response.strip()
-                    
-                    # Fallback: try to extract text from response
-                    return str(response).strip()
+                    return _chat_text(response)
                     
                 except Exception as chat_error:
                     # If chat_completion fails, fall back to text_generation
@@ -185,78 +540,123 @@ class HuggingFaceInferenceProvider(LLMProvider):
                         raise
             
             # Use text_generation API for non-instruction models or as fallback
-            # Format prompt for text generation
-            if "qwen" in model.lower():
-                # Qwen models work with simple prompt format
-                formatted_prompt = prompt
-                if system_prompt:
-                    formatted_prompt = f"{system_prompt}\n\n{prompt}"
-            else:
-                # For other models, use standard format
-                if system_prompt:
-                    formatted_prompt = f"{system_prompt}\n\nUser: {prompt}\nAssistant:"
-                else:
-                    formatted_prompt = prompt
+            formatted_prompt = self._format_prompt(model, prompt, system_prompt)
             
-            response = self.client.text_generation(
+            response = await self._call_api(
+                "text_generation",
+                api_key,
+                merged_config,
+                estimated_tokens,
                 formatted_prompt,
                 model=model,
-                max_new_tokens=merged_config.get("max_tokens", 512),
-                temperature=merged_config.get("temperature", 0.7),
-                top_p=merged_config.get("top_p", 0.95),
+                max_new_tokens=max_tokens,
                 return_full_text=False,
-                do_sample=True
+                **_sampling_kwargs(merged_config)
             )
-            
-            # Handle different response types
-            if isinstance(response, str):
-                return response.strip()
-            elif hasattr(response, 'generated_text'):
-                return str(response.generated_text).strip()
-            elif isinstance(response, dict):
-                # Handle dict responses
-                if "generated_text" in response:
-                    return str(response["generated_text"]).strip()
-                elif "text" in response:
-                    return str(response["text"]).strip()
-            else:
-                return str(response).strip()
+            return _generation_text(response)
+        
+        except Exception as e:
+            raise self._api_error(e, model)
+    
+    def _api_error(self, e: Exception, model: str) -> Exception:
+        """Translate a HuggingFace API error into a user-facing exception."""
+        error_msg = str(e)
+        error_type = type(e).__name__
+        
+        # Log the full original error for debugging
+        logger.error(f"[HuggingFace Inference] API error - Model: {model}, Error Type: {error_type}, Error: {error_msg}")
+        
+        # Provide helpful error messages with actual error details
+        matched = {match.lastgroup for match in _ERROR_RE.finditer(error_msg)}
+        kind = next((kind for kind in _ERROR_PRIORITY if kind in matched), None)
+        return Exception(_ERROR_MESSAGES[kind].format(model=model, error_msg=error_msg, error_type=error_type))
+    
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        config: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream response tokens from HuggingFace Inference API.
+        Uses chat_completion for instruction-tuned models and text_generation otherwise.
+        """
+        if not self.is_available() or not self.client:
+            raise Exception("HuggingFace Inference API is not available. Install huggingface_hub: pip install huggingface_hub")
+        
+        merged_config = self._merge_config(config)
+        model = merged_config.get("model", self.model)
+        system_prompt = system_prompt or merged_config.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
+        api_key = self._resolve_api_key(merged_config, model)
+        await check_prompt_size(
+            model, prompt, system_prompt, merged_config.get("max_input_tokens", DEFAULT_MAX_INPUT_TOKENS)
+        )
+        max_tokens = merged_config.get("max_tokens", 512)
+        throttle = get_throttle(self.get_provider_name(), api_key, merged_config)
+        
+        logger.info(f"[HuggingFace Inference] Streaming response - Model: {model}, Prompt Length: {len(prompt)}")
+        
+        try:
+            async with throttle.limit(estimate_tokens(prompt, system_prompt, max_tokens)):
+                if self._is_instruction_model(model):
+                    messages = _build_messages(system_prompt, prompt)
                     
+                    stream = await self.client.chat_completion(
+                        messages=messages,
+                        model=model,
+                        max_tokens=max_tokens,
+                        temperature=merged_config.get("temperature", 0.7),
+                        top_p=merged_config.get("top_p", 0.95),
+                        stream=True,
+                        **_prompt_cache_kwargs(merged_config, system_prompt),
+                    )
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                else:
+                    stream = await self.client.text_generation(
+                        self._format_prompt(model, prompt, system_prompt),
+                        model=model,
+                        max_new_tokens=max_tokens,
+                        return_full_text=False,
+                        stream=True,
+                        **_sampling_kwargs(merged_config),
+                    )
+                    async for token in stream:
+                        yield token
         except Exception as e:
-            error_msg = str(e)
-            error_type = type(e).__name__
-            
-            # Log the full original error for debugging
-            logger.error(f"[HuggingFace Inference] API error - Model: {model}, Error Type: {error_type}, Error: {error_msg}")
-            
-            # Provide helpful error messages with actual error details
-            # Check for specific error patterns first
-            if "503" in error_msg or "loading" in error_msg.lower() or "model is currently loading" in error_msg.lower():
-                raise Exception(f"Model {model} is currently loading. Please wait 30-60 seconds and try again. This is normal for models that haven't been used recently.")
-            elif "429" in error_msg or "rate limit" in error_msg.lower():
-                raise Exception(
-                    f"Rate limit reached. Your API key credits may be exhausted. "
-                    f"Check your usage at https://huggingface.co/settings/billing. "
-                    f"Free tier: $0.10/month, PRO: $2.00/month"
-                )
-            elif "401" in error_msg or "unauthorized" in error_msg.lower() or "invalid token" in error_msg.lower() or "authentication" in error_msg.lower():
-                raise Exception(
-                    f"Invalid or missing API key. Please check your HuggingFace API key. "
-                    f"Make sure you've set HF_TOKEN or HUGGINGFACE_API_KEY environment variable, "
-                    f"or provided it in the config. Get a token at https://huggingface.co/settings/tokens"
-                )
-            elif "404" in error_msg or "not found" in error_msg.lower() or "does not exist" in error_msg.lower():
-                raise Exception(f"Model {model} not found. Check the model ID at https://huggingface.co/models")
-            elif "not supported" in error_msg.lower() or "unsupported" in error_msg.lower():
-                # This error might be misleading - show the actual error message
-                raise Exception(
-                    f"API error for model {model}: {error_msg}. "
-                    f"This might indicate the model requires a different API method or your API key doesn't have access. "
-                    f"Check the model page at https://huggingface.co/{model} and verify your API key at https://huggingface.co/settings/tokens"
-                )
-            else:
-                # Return full error message for debugging - don't hide the actual error
-                raise Exception(f"HuggingFace Inference API error for {model} ({error_type}): {error_msg}")
+            raise self._api_error(e, model)
+    
+    async def warmup(self) -> None:
+        """
+        Send a 1-token request so a cold serverless model is loaded before user traffic.
+        Retries with exponential backoff while the API reports the model as loading (503).
+        """
+        if not self.is_available() or not self.client or not self.api_key:
+            return
+        
+        delay = 2.0
+        deadline = time.monotonic() + HF_WARMUP_TIMEOUT
+        while True:
+            try:
+                if self._is_instruction_model(self.model):
+                    await self.client.chat_completion(
+                        messages=[{"role": "user", "content": "hi"}],
+                        model=self.model,
+                        max_tokens=1,
+                    )
+                else:
+                    await self.client.text_generation("hi", model=self.model, max_new_tokens=1)
+                logger.info(f"[HuggingFace Inference] Model warm - Model: {self.model}")
+                return
+            except Exception as e:
+                error_msg = str(e)
+                loading = "503" in error_msg or "loading" in error_msg.lower()
+                if not loading or time.monotonic() + delay > deadline:
+                    logger.warning(f"[HuggingFace Inference] Warmup failed - Model: {self.model}, Error: {error_msg}")
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
     
     def is_available(self) -> bool:
         """
@@ -2,20 +2,131 @@
 Hugging Face Transformers LLM Provider implementation.
 Supports local inference using transformers library.
 """
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import contextlib
+import logging
 import os
+import queue
+import threading
 
 from app.services.llm_providers.base import LLMProvider
+from app.services.llm_providers.cache import cached_response
+from app.services.llm_providers.huggingface_inference_provider import _prefix_for
+from app.services.llm_providers.token_limits import DEFAULT_MAX_INPUT_TOKENS, check_prompt_size
+
+logger = logging.getLogger(__name__)
 
 # Hugging Face will be optional
 HF_AVAILABLE = False
 try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+    from transformers import (
+        AutoTokenizer,
+        AutoModelForCausalLM,
+        GenerationConfig,
+        StoppingCriteria,
+        StoppingCriteriaList,
+        TextIteratorStreamer,
+        pipeline,
+    )
     import torch
     HF_AVAILABLE = True
 except ImportError:
     pass
 
+# Streaming: how often to check on the generate() thread while waiting for text, and how
+# long to wait for the next chunk before giving up
+STREAM_POLL_INTERVAL = 1.0
+HF_STREAM_TIMEOUT = float(os.getenv("HF_STREAM_TIMEOUT", "120"))
+
+# Explicit SDPA kernel selection needs torch >= 2.3
+SDPA_KERNEL_AVAILABLE = False
+try:
+    from torch.nn.attention import SDPBackend, sdpa_kernel
+    SDPA_KERNEL_AVAILABLE = True
+except ImportError:
+    pass
+
+# bitsandbytes quantization is optional (CUDA only)
+BNB_AVAILABLE = False
+try:
+    from transformers import BitsAndBytesConfig
+    import bitsandbytes  # noqa: F401
+    BNB_AVAILABLE = True
+except ImportError:
+    pass
+
+
+if HF_AVAILABLE:
+    class _CancelGeneration(StoppingCriteria):
+        """Stops generate() once the event is set (e.g. the streaming client went away)."""
+        
+        def __init__(self, event: threading.Event):
+            self.event = event
+        
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class _PipelineBatcher:
+    """
+    Coalesces concurrent generate requests into batched pipeline calls.
+    Waits up to max_wait_ms after the first prompt for up to max_batch prompts,
+    then runs them as one forward pass in a worker thread.
+    """
+    
+    def __init__(self, provider: "HuggingFaceProvider", max_batch: int, max_wait_ms: float):
+        self.provider = provider
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def submit(self, full_prompt: str, max_length: int, temperature: float) -> str:
+        """Queue a prompt and wait for its generated text."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((full_prompt, (max_length, temperature), future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Prompts can only share a pipeline call when generation params match
+            groups: Dict[tuple, List] = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            
+            for (max_length, temperature), items in groups.items():
+                prompts = [prompt for prompt, _, _ in items]
+                try:
+                    texts = await loop.run_in_executor(
+                        None, self.provider._generate_batch, prompts, max_length, temperature
+                    )
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, _, future), text in zip(items, texts):
+                    if not future.done():
+                        future.set_result(text)
+
 
 class HuggingFaceProvider(LLMProvider):
     """
@@ -32,6 +143,15 @@ class HuggingFaceProvider(LLMProvider):
                 - model: Model name (default: "mistralai/Mistral-7B-Instruct-v0.2")
                 - device: Device to use ("cpu", "cuda", "auto")
                 - max_length: Maximum generation length
+                - quantization: "int8" or "int4" to load weights via bitsandbytes (CUDA only)
+                - compile: torch.compile the model forward on CUDA (default: True)
+                - batch_size: Max concurrent prompts coalesced into one pipeline call (default: 8)
+                - max_wait_ms: How long to wait for a batch to fill (default: 20)
+                - continuous_batching: Use paged-attention generate_batch instead of the pipeline
+                - attn_implementation: Paged attention backend (default: "paged|sdpa")
+                - num_blocks: KV cache blocks in the paged cache pool (default: 2048)
+                - max_batch_tokens: Token budget per scheduling step
+                - scheduler: Continuous batching scheduler (default: "prefill_first")
         """
         self.config = config or {}
         self.model_name = self.config.get(
@@ -44,10 +164,48 @@ class HuggingFaceProvider(LLMProvider):
         self.tokenizer = None
         self.model = None
         self.pipeline = None
+        self._use_cuda = False
+        self.continuous_batching = bool(self.config.get("continuous_batching", False))
+        self._batcher = _PipelineBatcher(
+            self,
+            int(self.config.get("batch_size", 8)),
+            float(self.config.get("max_wait_ms", 20))
+        )
         
         # Lazy loading - models are loaded on first use
         self._initialized = False
     
+    def _select_dtype(self, device: str):
+        """
+        Pick the narrowest well-supported dtype: decode is memory-bound, so halving
+        weight bytes roughly doubles tokens/sec.
+        """
+        if device == "cuda":
+            return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        bf16_check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+        if bf16_check is not None and bf16_check():
+            return torch.bfloat16
+        return torch.float32
+    
+    def _quantization_config(self, device: str):
+        """BitsAndBytesConfig for config["quantization"], or None."""
+        quantization = self.config.get("quantization")
+        if not quantization:
+            return None
+        if device != "cuda" or not BNB_AVAILABLE:
+            logger.warning("Quantization %s requires CUDA and bitsandbytes, loading unquantized", quantization)
+            return None
+        if quantization == "int8":
+            return BitsAndBytesConfig(load_in_8bit=True)
+        if quantization == "int4":
+            return BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_compute_dtype=torch.bfloat16,
+                bnb_4bit_quant_type="nf4"
+            )
+        logger.warning("Unknown quantization %s, loading unquantized", quantization)
+        return None
+    
     def _initialize(self):
         """Lazy initialization of model."""
         if self._initialized or not HF_AVAILABLE:
@@ -61,33 +219,132 @@ class HuggingFaceProvider(LLMProvider):
                 device = self.device
             
             # Load tokenizer and model
-            print(f"Loading Hugging Face model: {self.model_name} on {device}")
+            logger.info("Loading Hugging Face model: %s on %s", self.model_name, device)
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-                device_map="auto" if device == "cuda" else None,
-                low_cpu_mem_usage=True
-            )
+            # Left padding so batched causal-LM prompts generate from aligned positions
+            self.tokenizer.padding_side = "left"
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            # Allow TF32 / reduced-precision tensor core matmuls for float32 ops
+            torch.set_float32_matmul_precision("high")
+            quantization_config = self._quantization_config(device)
+            model_kwargs = {
+                "torch_dtype": self._select_dtype(device),
+                "device_map": "auto" if device == "cuda" else None,
+                "low_cpu_mem_usage": True
+            }
+            if quantization_config is not None:
+                model_kwargs["quantization_config"] = quantization_config
+            self.model = None
+            if self.continuous_batching:
+                try:
+                    self.model = AutoModelForCausalLM.from_pretrained(
+                        self.model_name,
+                        attn_implementation=self.config.get("attn_implementation", "paged|sdpa"),
+                        **model_kwargs
+                    )
+                    if not hasattr(self.model, "generate_batch"):
+                        raise ValueError("installed transformers has no generate_batch")
+                except Exception as e:
+                    logger.warning("Continuous batching unsupported for %s, using pipeline: %s", self.model_name, e)
+                    self.continuous_batching = False
+                    self.model = None
+            if self.model is None:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    attn_implementation="sdpa",
+                    **model_kwargs
+                )
             
             if device == "cpu":
                 self.model = self.model.to(device)
             
-            # Create pipeline
+            self._use_cuda = device == "cuda"
+            # Compile forward only: generate() and the pipeline keep calling it through the module
+            if self._use_cuda and not self.continuous_batching and self.config.get("compile", True):
+                try:
+                    self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", fullgraph=False)
+                except Exception as e:
+                    logger.warning("torch.compile unavailable for %s, using eager forward: %s", self.model_name, e)
+            
+            # Create pipeline (quantized models are already placed by device_map and can't be moved)
+            pipeline_kwargs = {}
+            if quantization_config is None:
+                pipeline_kwargs["device"] = 0 if device == "cuda" else -1
             self.pipeline = pipeline(
                 "text-generation",
                 model=self.model,
                 tokenizer=self.tokenizer,
-                device=0 if device == "cuda" else -1,
-                max_length=self.max_length
+                max_length=self.max_length,
+                **pipeline_kwargs
             )
             
+            # One-token run pays for kernel selection / compilation before user traffic
+            try:
+                with self._attention_context():
+                    self.pipeline("hi", max_new_tokens=1, pad_token_id=self.tokenizer.eos_token_id)
+            except Exception as e:
+                logger.warning("Warmup generation failed for %s: %s", self.model_name, e)
+            
             self._initialized = True
-            print(f"✅ Hugging Face model loaded successfully")
+            logger.info("Hugging Face model loaded successfully: %s", self.model_name)
         except Exception as e:
-            print(f"Error loading Hugging Face model: {e}")
+            logger.exception("Error loading Hugging Face model: %s", self.model_name)
             self._initialized = False
     
+    def _attention_context(self):
+        """Restrict SDPA to fused FlashAttention / memory-efficient kernels (math as last resort) on CUDA."""
+        if not self._use_cuda or not SDPA_KERNEL_AVAILABLE:
+            return contextlib.nullcontext()
+        return sdpa_kernel([SDPBackend.FLASH_ATTENTION, SDPBackend.EFFICIENT_ATTENTION, SDPBackend.MATH])
+    
+    @staticmethod
+    def _sampling_kwargs(temperature: float) -> Dict:
+        """Sampling for temperature > 0, otherwise plain greedy search (no softmax/RNG per token)."""
+        if temperature > 0:
+            return {"do_sample": True, "temperature": temperature}
+        return {"do_sample": False, "num_beams": 1}
+    
+    def _generate_batch(self, prompts: List[str], max_length: int, temperature: float = 0.7) -> List[str]:
+        """Run one batched pipeline call and strip each prompt from its output."""
+        if self.continuous_batching:
+            return self._generate_continuous(prompts, max_length, temperature)
+        
+        with self._attention_context():
+            results = self.pipeline(
+                prompts,
+                batch_size=len(prompts),
+                max_length=max_length,
+                num_return_sequences=1,
+                pad_token_id=self.tokenizer.eos_token_id,
+                **self._sampling_kwargs(temperature)
+            )
+        return [
+            result[0]['generated_text'][len(prompt):].strip()
+            for prompt, result in zip(prompts, results)
+        ]
+    
+    def _generate_continuous(self, prompts: List[str], max_length: int, temperature: float = 0.7) -> List[str]:
+        """Generate a batch with paged-attention continuous batching (shared KV cache pool)."""
+        generation_config = GenerationConfig(
+            max_new_tokens=max_length,
+            **self._sampling_kwargs(temperature),
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id,
+            num_blocks=self.config.get("num_blocks", 2048),
+            max_batch_tokens=self.config.get("max_batch_tokens"),
+            scheduler=self.config.get("scheduler", "prefill_first")
+        )
+        inputs = [self.tokenizer(prompt)["input_ids"] for prompt in prompts]
+        results = self.model.generate_batch(inputs=inputs, generation_config=generation_config)
+        # Request ids are assigned in submission order ("req_0", "req_1", ...)
+        outputs = sorted(results.values(), key=lambda output: int(output.request_id.rsplit("_", 1)[-1]))
+        return [
+            self.tokenizer.decode(output.generated_tokens, skip_special_tokens=True).strip()
+            for output in outputs
+        ]
+    
+    @cached_response
     async def generate_response(
         self,
         prompt: str,
@@ -108,34 +365,111 @@ class HuggingFaceProvider(LLMProvider):
             raise Exception("Failed to initialize Hugging Face model")
         
         # Merge config
-        merged_config = {**self.config, **(config or {})}
+        merged_config = self._merge_config(config)
         max_length = merged_config.get("max_length", self.max_length)
+        temperature = merged_config.get("temperature", 0.7)
         
         # Build full prompt
         system_prompt = system_prompt or "You are a helpful assistant."
-        full_prompt = f"{system_prompt}\n\nUser: {prompt}\nAssistant:"
+        await check_prompt_size(
+            self.model_name, prompt, system_prompt, merged_config.get("max_input_tokens", DEFAULT_MAX_INPUT_TOKENS)
+        )
+        head, tail = _prefix_for(system_prompt)
+        full_prompt = head + prompt + tail
         
         try:
-            # Generate response
-            results = self.pipeline(
-                full_prompt,
-                max_length=max_length,
-                num_return_sequences=1,
-                temperature=0.7,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-            
-            # Extract generated text
-            generated_text = results[0]['generated_text']
-            
-            # Remove the prompt from the response
-            response = generated_text[len(full_prompt):].strip()
-            
-            return response
+            # Concurrent requests are coalesced into a single batched forward pass
+            return await self._batcher.submit(full_prompt, max_length, temperature)
         except Exception as e:
             raise Exception(f"Hugging Face generation failed: {e}")
     
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        config: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream generated text using a TextIteratorStreamer.
+        generate() runs in a worker thread; decoded chunks are pulled from the streamer
+        without blocking the event loop.
+        """
+        if not self.is_available():
+            raise Exception("Hugging Face is not available")
+        
+        merged_config = self._merge_config(config)
+        max_length = merged_config.get("max_length", self.max_length)
+        temperature = merged_config.get("temperature", 0.7)
+        system_prompt = system_prompt or "You are a helpful assistant."
+        await check_prompt_size(
+            self.model_name, prompt, system_prompt, merged_config.get("max_input_tokens", DEFAULT_MAX_INPUT_TOKENS)
+        )
+        head, tail = _prefix_for(system_prompt)
+        full_prompt = head + prompt + tail
+        
+        inputs = self.tokenizer(full_prompt, return_tensors="pt").to(self.model.device)
+        # next() raises queue.Empty after the timeout, so a stalled or crashed generate()
+        # can't block a worker thread forever
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=STREAM_POLL_INTERVAL
+        )
+        cancelled = threading.Event()
+        
+        def _generate():
+            try:
+                with self._attention_context():
+                    self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        max_length=max_length,
+                        pad_token_id=self.tokenizer.eos_token_id,
+                        stopping_criteria=StoppingCriteriaList([_CancelGeneration(cancelled)]),
+                        **self._sampling_kwargs(temperature)
+                    )
+            finally:
+                # Always signal end-of-stream, even if generate() raised before finishing
+                streamer.end()
+        
+        generation = asyncio.create_task(asyncio.to_thread(_generate))
+        
+        # Sentinel: next() on an exhausted streamer raises StopIteration, which can't cross to_thread
+        done = object()
+        
+        def _next_chunk():
+            try:
+                return next(streamer, done)
+            except queue.Empty:
+                return None
+        
+        try:
+            idle = 0.0
+            while True:
+                chunk = await asyncio.to_thread(_next_chunk)
+                if chunk is done:
+                    break
+                if chunk is None:
+                    # Nothing yet: surface a generate() failure, otherwise keep waiting up to the limit
+                    if generation.done() and generation.exception() is not None:
+                        raise generation.exception()
+                    idle += STREAM_POLL_INTERVAL
+                    if idle >= HF_STREAM_TIMEOUT:
+                        raise TimeoutError(f"no output for {HF_STREAM_TIMEOUT:.0f}s")
+                    continue
+                idle = 0.0
+                if chunk:
+                    yield chunk
+            await generation
+        except Exception as e:
+            raise Exception(f"Hugging Face streaming failed: {e}")
+        finally:
+            # Client disconnected, timed out or generation failed: stop generate() at the next token
+            cancelled.set()
+    
+    async def warmup(self) -> None:
+        """Load (and warm) the model in a worker thread."""
+        if HF_AVAILABLE and not self._initialized:
+            await asyncio.to_thread(self._initialize)
+    
     def is_available(self) -> bool:
         """
         Check if Hugging Face is available.
@@ -2,14 +2,27 @@
 Ollama LLM Provider implementation.
 Supports local Ollama models (Llama, Mistral, etc.)
 """
+import asyncio
 import os
 import logging
-from typing import Dict, Optional
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
 
 from app.services.llm_providers.base import LLMProvider
+from app.services.llm_providers.cache import cached_response
+from app.services.llm_providers.token_limits import check_prompt_size
 
 logger = logging.getLogger(__name__)
 
+# How long a health check result is reused before Ollama is probed again
+OLLAMA_HEALTH_TTL = float(os.getenv("OLLAMA_HEALTH_TTL", "30"))
+OLLAMA_HEALTH_TIMEOUT = 2.0
+# Runtime tuning passed as Ollama request options
+OLLAMA_NUM_CTX = int(os.getenv("N_CTX", "2048"))
+OLLAMA_NUM_THREAD = os.getenv("N_THREADS")
+
 # Ollama will be optional - fallback if not available
 OLLAMA_AVAILABLE = False
 try:
@@ -24,6 +37,13 @@ class OllamaProvider(LLMProvider):
     Ollama provider for local LLM inference.
     """
     
+    # Shared across instances: health results keyed by base_url, one pooled HTTP client
+    _availability_cache: Dict[str, Tuple[float, Tuple[bool, str]]] = {}
+    _http_client: Optional[httpx.AsyncClient] = None
+    # Base URLs with a background health probe in flight (and the tasks, kept referenced)
+    _refreshing: Set[str] = set()
+    _refresh_tasks: Set["asyncio.Task"] = set()
+    
     def __init__(self, config: Optional[Dict] = None):
         """
         Initialize Ollama provider.
@@ -32,18 +52,37 @@ class OllamaProvider(LLMProvider):
             config: Configuration dict with:
                 - model: Model name (default: "llama3.2")
                 - base_url: Ollama API base URL (default: "http://localhost:11434")
+                - num_ctx: Context window size (default: N_CTX env or 2048)
+                - num_thread: CPU threads for generation (default: N_THREADS env, else Ollama's choice)
         """
         self.config = config or {}
         self.model = self.config.get("model", os.getenv("OLLAMA_MODEL", "llama3.2"))
         self.base_url = self.config.get("base_url", os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
         
-        # Set base URL if provided
-        if self.base_url and OLLAMA_AVAILABLE:
+        # Reused across requests instead of building a client per call
+        self.client = None
+        if OLLAMA_AVAILABLE:
             try:
-                ollama.Client(host=self.base_url)
-            except:
-                pass
+                self.client = ollama.AsyncClient(host=self.base_url)
+            except Exception as e:
+                logger.error(f"[Ollama] Error initializing client: {e}")
     
+    def _build_request(self, prompt: str, system_prompt: Optional[str], config: Optional[Dict]) -> Tuple[str, List[Dict], Dict]:
+        """Resolve (model, messages, options) for a chat request."""
+        merged_config = self._merge_config(config)
+        model = merged_config.get("model", self.model)
+        system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        options = {"num_ctx": int(merged_config.get("num_ctx", OLLAMA_NUM_CTX))}
+        num_thread = merged_config.get("num_thread", OLLAMA_NUM_THREAD)
+        if num_thread:
+            options["num_thread"] = int(num_thread)
+        return model, messages, options
+    
+    @cached_response
     async def generate_response(
         self,
         prompt: str,
@@ -53,41 +92,24 @@ class OllamaProvider(LLMProvider):
         """
         Generate response using Ollama.
         """
-        if not self.is_available():
+        available, _ = await self.get_availability_info()
+        if not available or not self.client:
             raise Exception("Ollama is not available")
         
-        # Merge config
-        merged_config = {**self.config, **(config or {})}
-        model = merged_config.get("model", self.model)
-        system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
+        model, messages, options = self._build_request(prompt, system_prompt, config)
+        # Ollama silently truncates input beyond the context window; fail fast instead
+        await check_prompt_size(None, prompt, messages[0]["content"], options["num_ctx"])
         
         logger.info(
             f"[Ollama] Generating response - Model: {model}, "
             f"Base URL: {self.base_url}, Prompt Length: {len(prompt)}, "
-            f"Has System Prompt: {bool(system_prompt)}"
+            f"Has System Prompt: {bool(messages[0]['content'])}"
         )
         
         try:
             logger.debug(f"[Ollama] Calling API - Model: {model}, Base URL: {self.base_url}")
             
-            # Use the base_url if configured
-            if self.base_url and self.base_url != "http://localhost:11434":
-                client = ollama.Client(host=self.base_url)
-                response = client.chat(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-            else:
-                response = ollama.chat(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
+            response = await self.client.chat(model=model, messages=messages, options=options)
             
             response_text = response['message']['content']
             logger.info(f"[Ollama] Generation successful - Model: {model}, Response Length: {len(response_text) if response_text else 0}")
@@ -98,20 +120,146 @@ class OllamaProvider(LLMProvider):
             logger.error(f"[Ollama] {error_msg}", exc_info=True)
             raise Exception(error_msg)
     
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        config: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream response chunks from Ollama as they are generated.
+        """
+        available, _ = await self.get_availability_info()
+        if not available or not self.client:
+            raise Exception("Ollama is not available")
+        
+        model, messages, options = self._build_request(prompt, system_prompt, config)
+        # Ollama silently truncates input beyond the context window; fail fast instead
+        await check_prompt_size(None, prompt, messages[0]["content"], options["num_ctx"])
+        logger.info(f"[Ollama] Streaming response - Model: {model}, Prompt Length: {len(prompt)}")
+        
+        try:
+            stream = await self.client.chat(model=model, messages=messages, options=options, stream=True)
+            async for part in stream:
+                content = part['message']['content']
+                if content:
+                    yield content
+        except Exception as e:
+            error_msg = f"Ollama streaming failed for model {model}: {e}"
+            logger.error(f"[Ollama] {error_msg}", exc_info=True)
+            raise Exception(error_msg)
+    
+    async def warmup(self) -> None:
+        """
+        Load the model weights into RAM/VRAM and keep them resident for an hour.
+        """
+        available, _ = await self.get_availability_info()
+        if not available or not self.client:
+            return
+        try:
+            await self.client.generate(model=self.model, prompt="", keep_alive="1h")
+            logger.info(f"[Ollama] Model warm - Model: {self.model}")
+        except Exception as e:
+            logger.warning(f"[Ollama] Warmup failed - Model: {self.model}, Error: {e}")
+    
     def is_available(self) -> bool:
         """
         Check if Ollama is available.
         Returns True if available, False otherwise.
         For detailed information, use get_availability_info().
+        
+        Served from the cached health check. When it is missing or stale inside a running
+        event loop, the last known result (False if none) is returned and a probe is scheduled
+        in the background; only callers without a loop probe Ollama (blocking).
+        Async callers should use check_available().
         """
-        available, _ = self.get_availability_info()
+        cached = self._cached_availability()
+        if cached is not None:
+            return cached[0]
+        
+        result = self._static_availability()
+        if result is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                if self.base_url not in self._refreshing:
+                    self._refreshing.add(self.base_url)
+                    task = loop.create_task(self._refresh_availability())
+                    self._refresh_tasks.add(task)
+                    task.add_done_callback(self._refresh_tasks.discard)
+                stale = self._availability_cache.get(self.base_url)
+                return stale[1][0] if stale else False
+            
+            try:
+                response = httpx.get(f"{self.base_url}/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT)
+                result = self._availability_from_response(response)
+            except Exception as e:
+                result = self._availability_from_error(e)
+        self._availability_cache[self.base_url] = (time.monotonic(), result)
+        return result[0]
+    
+    async def check_available(self) -> bool:
+        """Non-blocking availability check (probes Ollama asynchronously when the cache is stale)."""
+        available, _ = await self.get_availability_info()
         return available
     
-    def get_availability_info(self) -> tuple[bool, str]:
+    async def _refresh_availability(self) -> None:
+        try:
+            await self.get_availability_info(force=True)
+        finally:
+            self._refreshing.discard(self.base_url)
+    
+    @classmethod
+    def _get_http_client(cls) -> httpx.AsyncClient:
+        if cls._http_client is None:
+            cls._http_client = httpx.AsyncClient(
+                timeout=OLLAMA_HEALTH_TIMEOUT,
+                limits=httpx.Limits(max_keepalive_connections=4)
+            )
+        return cls._http_client
+    
+    def _cached_availability(self) -> Optional[Tuple[bool, str]]:
+        entry = self._availability_cache.get(self.base_url)
+        if entry and time.monotonic() - entry[0] < OLLAMA_HEALTH_TTL:
+            return entry[1]
+        return None
+    
+    @classmethod
+    async def close_http_client(cls):
+        """Close the shared health-check HTTP client."""
+        if cls._http_client is not None:
+            await cls._http_client.aclose()
+            cls._http_client = None
+    
+    async def get_availability_info(self, force: bool = False) -> tuple[bool, str]:
         """
         Check Ollama with detailed setup guidance.
-        Returns tuple of (is_available, message).
+        Results are cached for OLLAMA_HEALTH_TTL seconds per base URL.
+        
+        Args:
+            force: Skip the cached result and probe Ollama again
+        
+        Returns:
+            Tuple of (is_available, message)
         """
+        cached = None if force else self._cached_availability()
+        if cached is not None:
+            return cached
+        
+        result = self._static_availability()
+        if result is None:
+            try:
+                response = await self._get_http_client().get(f"{self.base_url}/api/tags")
+                result = self._availability_from_response(response)
+            except Exception as e:
+                result = self._availability_from_error(e)
+        self._availability_cache[self.base_url] = (time.monotonic(), result)
+        return result
+    
+    def _static_availability(self) -> Optional[Tuple[bool, str]]:
+        """Checks that need no network access; None means Ollama must be probed."""
         from app.config import is_cloud_environment
         
         if not OLLAMA_AVAILABLE:
@@ -128,27 +276,31 @@ class OllamaProvider(LLMProvider):
                     "   2. Choose a free model (Mistral 7B recommended)\n"
                     "   3. Test connection - works immediately!")
         
-        # Try to connect and list models
-        try:
-            import requests
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.ok:
-                models = response.json().get("models", [])
-                if not models:
-                    return (False, 
-                            "⚠️ Ollama is running but no models installed.\n"
-                            "Run: ollama pull llama3.2")
-                return (True, f"✅ Ollama running with {len(models)} model(s)")
-            return (False, f"⚠️ Ollama returned status {response.status_code}")
-        except requests.exceptions.ConnectionError:
+        return None
+    
+    @staticmethod
+    def _availability_from_response(response: httpx.Response) -> Tuple[bool, str]:
+        """Interpret the /api/tags response."""
+        if response.is_success:
+            models = response.json().get("models", [])
+            if not models:
+                return (False, 
+                        "⚠️ Ollama is running but no models installed.\n"
+                        "Run: ollama pull llama3.2")
+            return (True, f"✅ Ollama running with {len(models)} model(s)")
+        return (False, f"⚠️ Ollama returned status {response.status_code}")
+    
+    @staticmethod
+    def _availability_from_error(error: Exception) -> Tuple[bool, str]:
+        """Interpret a failed /api/tags request."""
+        if isinstance(error, httpx.ConnectError):
             return (False, 
                     "❌ Can't connect to Ollama. Setup needed:\n"
                     "   1. Install from https://ollama.ai/download\n"
                     "   2. Start service: ollama serve\n"
                     "   3. Pull a model: ollama pull llama3.2\n"
                     "   4. Test connection again")
-        except Exception as e:
-            return (False, f"❌ Error: {str(e)}")
+        return (False, f"❌ Error: {str(error)}")
     
     def get_provider_name(self) -> str:
         return "ollama"
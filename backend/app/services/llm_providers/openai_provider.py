@@ -4,20 +4,64 @@ Supports GPT-4, GPT-3.5, and other OpenAI models via API.
 """
 import os
 import logging
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
 
 from app.services.llm_providers.base import LLMProvider
+from app.services.llm_providers.cache import cached_response
+from app.services.llm_providers.retry import retry_transient
+from app.services.llm_providers.throttle import estimate_tokens, get_throttle
 
 logger = logging.getLogger(__name__)
 
 # OpenAI will be optional - fallback if not available
 OPENAI_AVAILABLE = False
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     pass
 
+# HTTP/2 needs the optional h2 package
+H2_AVAILABLE = False
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    pass
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Streaming memory caps: bytes per delta chunk, and bytes per streamed message
+# (override the latter per request with config["max_stream_bytes"])
+STREAM_MAX_CHUNK_BYTES = 16 * 1024
+DEFAULT_MAX_STREAM_BYTES = int(os.getenv("OPENAI_MAX_STREAM_BYTES", str(1024 * 1024)))
+STREAM_TRUNCATED_MARKER = "[truncated]"
+
+# One keep-alive connection pool shared by every OpenAIProvider instance
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Get the shared httpx client (created on first use)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=H2_AVAILABLE,
+            timeout=OPENAI_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared httpx client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 class OpenAIProvider(LLMProvider):
     """
@@ -42,13 +86,31 @@ class OpenAIProvider(LLMProvider):
         self.client = None
         if OPENAI_AVAILABLE and self.api_key:
             try:
-                client_kwargs = {"api_key": self.api_key}
+                # Retries are handled by retry_transient so they aren't compounded with the SDK's
+                client_kwargs = {"api_key": self.api_key, "http_client": _get_http_client(), "max_retries": 0}
                 if self.base_url:
                     client_kwargs["base_url"] = self.base_url
-                self.client = OpenAI(**client_kwargs)
+                self.client = AsyncOpenAI(**client_kwargs)
             except Exception as e:
-                print(f"Error initializing OpenAI client: {e}")
+                logger.error("Error initializing OpenAI client: %s", e)
+    
+    def _build_request(self, prompt: str, system_prompt: Optional[str], config: Optional[Dict]) -> Tuple[Dict, Dict, int]:
+        """Resolve (merged config, chat completion params, estimated tokens) for a request."""
+        merged_config = self._merge_config(config)
+        system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        params = {
+            "model": merged_config.get("model", self.model),
+            "messages": messages,
+            "temperature": merged_config.get("temperature", 0.7),
+            "max_tokens": merged_config.get("max_tokens", 1000)
+        }
+        return merged_config, params, estimate_tokens(prompt, system_prompt, params["max_tokens"])
     
+    @cached_response
     async def generate_response(
         self,
         prompt: str,
@@ -61,30 +123,26 @@ class OpenAIProvider(LLMProvider):
         if not self.is_available():
             raise Exception("OpenAI is not available")
         
-        # Merge config
-        merged_config = {**self.config, **(config or {})}
-        model = merged_config.get("model", self.model)
-        system_prompt = system_prompt or merged_config.get("system_prompt", "You are a helpful assistant.")
+        merged_config, params, estimated_tokens = self._build_request(prompt, system_prompt, config)
+        model = params["model"]
         
         logger.info(
             f"[OpenAI] Generating response - Model: {model}, "
-            f"Prompt Length: {len(prompt)}, Has System Prompt: {bool(system_prompt)}"
+            f"Prompt Length: {len(prompt)}, Has System Prompt: {len(params['messages']) > 1}"
         )
         
         try:
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
+            logger.debug(f"[OpenAI] Calling API - Model: {model}, Messages: {len(params['messages'])}")
+            
+            throttle = get_throttle(self.get_provider_name(), self.api_key, merged_config)
             
-            logger.debug(f"[OpenAI] Calling API - Model: {model}, Messages: {len(messages)}")
+            async def _create():
+                async with throttle.limit(estimated_tokens):
+                    raw = await self.client.chat.completions.with_raw_response.create(**params)
+                throttle.update_from_headers(raw.headers)
+                return raw.parse()
             
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=merged_config.get("temperature", 0.7),
-                max_tokens=merged_config.get("max_tokens", 1000)
-            )
+            response = await retry_transient(_create)
             
             response_text = response.choices[0].message.content
             logger.info(f"[OpenAI] Generation successful - Model: {model}, Response Length: {len(response_text) if response_text else 0}")
@@ -95,6 +153,67 @@ class OpenAIProvider(LLMProvider):
             logger.error(f"[OpenAI] {error_msg}", exc_info=True)
             raise Exception(error_msg)
     
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        config: Optional[Dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream response text from OpenAI API as it is generated.
+        """
+        if not self.is_available():
+            raise Exception("OpenAI is not available")
+        
+        merged_config, params, estimated_tokens = self._build_request(prompt, system_prompt, config)
+        model = params["model"]
+        max_stream_bytes = int(merged_config.get("max_stream_bytes", DEFAULT_MAX_STREAM_BYTES))
+        
+        logger.info(f"[OpenAI] Streaming response - Model: {model}, Prompt Length: {len(prompt)}")
+        
+        throttle = get_throttle(self.get_provider_name(), self.api_key, merged_config)
+        try:
+            async with throttle.limit(estimated_tokens):
+                stream = await self.client.chat.completions.create(**params, stream=True)
+                # Chunks go straight to the caller; only their size is tracked (no string accumulation)
+                response_length = 0
+                async for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    size = len(text.encode())
+                    if size > STREAM_MAX_CHUNK_BYTES:
+                        text = text.encode()[:STREAM_MAX_CHUNK_BYTES].decode(errors="ignore")
+                        size = len(text.encode())
+                    if response_length + size > max_stream_bytes:
+                        logger.warning(
+                            f"[OpenAI] Stream truncated - Model: {model}, "
+                            f"Limit: {max_stream_bytes} bytes"
+                        )
+                        await stream.close()
+                        yield STREAM_TRUNCATED_MARKER
+                        break
+                    response_length += size
+                    yield text
+            logger.info(f"[OpenAI] Streaming complete - Model: {model}, Response Length: {response_length}")
+        except Exception as e:
+            error_msg = f"OpenAI streaming failed for model {model}: {e}"
+            logger.error(f"[OpenAI] {error_msg}", exc_info=True)
+            raise Exception(error_msg)
+    
+    async def warmup(self) -> None:
+        """
+        Open a keep-alive TLS connection to the API so the first request skips the handshake.
+        """
+        if not self.is_available():
+            return
+        url = self.base_url or "https://api.openai.com/v1"
+        try:
+            await _get_http_client().head(url)
+            logger.info(f"[OpenAI] Connection pre-warmed - URL: {url}")
+        except Exception as e:
+            logger.warning(f"[OpenAI] Connection pre-warm failed - URL: {url}, Error: {e}")
+    
     def is_available(self) -> bool:
         """
         Check if OpenAI is available and configured.
@@ -0,0 +1,81 @@
+"""
+Retry helper for transient LLM provider errors.
+Retries rate limits (429), overload/unavailable (5xx), timeouts and connection errors
+with exponential backoff and jitter. All other errors are raised immediately.
+"""
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+# Maximum server-requested Retry-After we are willing to honour (seconds)
+MAX_RETRY_AFTER = 10.0
+
+
+def _get_status_code(error: Exception) -> Optional[int]:
+    """Extract an HTTP status code from SDK / HTTP client exceptions."""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Check if an error is worth retrying (rate limit, 5xx, timeout, connection)."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = _get_status_code(error)
+    if status is not None:
+        return status in TRANSIENT_STATUS_CODES
+    # SDK timeout/connection errors (anthropic.APITimeoutError, httpx.ConnectError, ...)
+    # without importing the optional SDKs
+    return any(
+        "Timeout" in cls.__name__ or "Connection" in cls.__name__
+        for cls in type(error).__mro__
+    )
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return min(float(headers.get("retry-after")), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return None
+
+
+async def retry_transient(
+    call: Callable[[], Awaitable[T]],
+    retries: int = 3,
+    base_delay: float = 0.5
+) -> T:
+    """
+    Await `call()`, retrying transient errors with exponential backoff and jitter.
+    
+    Args:
+        call: Zero-argument callable returning a fresh awaitable per attempt
+        retries: Maximum number of attempts
+        base_delay: Delay before the first retry (doubles each attempt)
+    
+    Returns:
+        Result of the first successful attempt
+    """
+    for attempt in range(retries):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == retries - 1 or not is_transient_error(e):
+                raise
+            delay = _get_retry_after(e) or base_delay * 2 ** attempt + random.random() * 0.3
+            logger.warning(
+                f"[LLM Retry] Transient error (attempt {attempt + 1}/{retries}), "
+                f"retrying in {delay:.2f}s: {type(e).__name__}: {e}"
+            )
+            await asyncio.sleep(delay)
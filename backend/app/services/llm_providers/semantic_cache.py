@@ -0,0 +1,80 @@
+"""
+Embedding-similarity store used by the AI response cache (app/services/semantic_cache.py).
+Holds (embedding, response) pairs per namespace and returns a cached response when a new
+embedding is a close enough match (cosine similarity over unit vectors).
+"""
+import threading
+import time
+from typing import Optional
+
+# numpy is optional - the store can't be built without it
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_SIZE = 4096
+SEMANTIC_CACHE_TTL = 3600
+EMBEDDING_DIM = 384
+
+
+class SemanticLLMCache:
+    """
+    Bounded LRU store of (embedding, response) pairs.
+    
+    Vectors live in one contiguous float32 matrix (unit-normalized), so a lookup is a
+    single matrix-vector product instead of a Python loop over entries.
+    """
+    
+    def __init__(
+        self,
+        max_size: int = SEMANTIC_CACHE_MAX_SIZE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        dim: int = EMBEDDING_DIM
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self._namespaces = np.empty(max_size, dtype=object)
+        self._expires_at = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.float64)
+        self._responses = [None] * max_size
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def lookup(self, namespace: str, vector) -> Optional[str]:
+        """Return the best cached response above the similarity threshold, if any."""
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return None
+            now = time.monotonic()
+            scores = self._vectors[:n] @ vector
+            valid = (self._namespaces[:n] == namespace) & (self._expires_at[:n] > now)
+            scores = np.where(valid, scores, -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._last_used[best] = now
+            return self._responses[best]
+    
+    def store(self, namespace: str, vector, response: str, ttl: int = SEMANTIC_CACHE_TTL):
+        """Insert an entry, evicting the least recently used one when full."""
+        with self._lock:
+            now = time.monotonic()
+            if self._size < self.max_size:
+                slot = self._size
+                self._size += 1
+            else:
+                # Expired entries have the oldest effective use time
+                last_used = np.where(self._expires_at > now, self._last_used, -1.0)
+                slot = int(np.argmin(last_used))
+            self._vectors[slot] = vector
+            self._namespaces[slot] = namespace
+            self._expires_at[slot] = now + ttl
+            self._last_used[slot] = now
+            self._responses[slot] = response
+
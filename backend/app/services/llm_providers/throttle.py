@@ -0,0 +1,136 @@
+"""
+Outbound throttling for LLM providers.
+Caps concurrent requests and enforces requests-per-minute / tokens-per-minute budgets
+per provider and API key, so bursts queue locally instead of triggering provider 429s.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default limits per provider: requests/min, tokens/min, concurrent requests.
+# Override with <PROVIDER>_RPM, <PROVIDER>_TPM, <PROVIDER>_MAX_CONCURRENCY env vars.
+DEFAULT_PROVIDER_LIMITS = {
+    "anthropic": {"rpm": 50, "tpm": 40000, "max_concurrency": 10},
+    "openai": {"rpm": 500, "tpm": 200000, "max_concurrency": 20},
+    "huggingface_inference": {"rpm": 30, "tpm": 0, "max_concurrency": 5},
+}
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at a per-minute rate."""
+    
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available, then consume them."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class ProviderThrottle:
+    """Concurrency cap plus RPM/TPM token buckets for one provider endpoint."""
+    
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_concurrency: int = 0, adaptive: bool = False):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        # Defaults (not explicit config) may be replaced by the limits the provider reports
+        self.adaptive = adaptive
+    
+    def update_from_headers(self, headers) -> None:
+        """
+        Adopt the account's real RPM/TPM from x-ratelimit-limit-* response headers.
+        Only applies once, and only when limits were not set explicitly.
+        """
+        if not self.adaptive:
+            return
+        self.adaptive = False
+        try:
+            rpm = int(headers.get("x-ratelimit-limit-requests") or 0)
+            tpm = int(headers.get("x-ratelimit-limit-tokens") or 0)
+        except (TypeError, ValueError):
+            return
+        if rpm > 0 and (self.requests is None or self.requests.capacity != rpm):
+            self.requests = TokenBucket(rpm)
+        if tpm > 0 and (self.tokens is None or self.tokens.capacity != tpm):
+            self.tokens = TokenBucket(tpm)
+        if rpm > 0 or tpm > 0:
+            logger.info(f"[Throttle] Adopted provider-reported limits - RPM: {rpm}, TPM: {tpm}")
+    
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: int = 0):
+        """Hold a concurrency slot and rate budget for the duration of one API call."""
+        if self._semaphore:
+            await self._semaphore.acquire()
+        try:
+            if self.requests:
+                await self.requests.acquire(1)
+            if self.tokens and estimated_tokens:
+                await self.tokens.acquire(estimated_tokens)
+            yield
+        finally:
+            if self._semaphore:
+                self._semaphore.release()
+
+
+_throttles: Dict[Tuple[str, Optional[str]], ProviderThrottle] = {}
+
+
+def _get_limit(provider_name: str, name: str, config: Dict) -> int:
+    if name in config:
+        return int(config[name])
+    env_value = os.getenv(f"{provider_name.upper()}_{name.upper()}")
+    if env_value is not None:
+        return int(env_value)
+    return DEFAULT_PROVIDER_LIMITS.get(provider_name, {}).get(name, 0)
+
+
+def _is_configured(provider_name: str, name: str, config: Dict) -> bool:
+    return name in config or os.getenv(f"{provider_name.upper()}_{name.upper()}") is not None
+
+
+def get_throttle(provider_name: str, api_key: Optional[str] = None, config: Optional[Dict] = None) -> ProviderThrottle:
+    """
+    Get the shared throttle for a provider endpoint.
+    Provider instances using the same API key share one throttle.
+    
+    Args:
+        provider_name: Provider name (e.g., "anthropic")
+        api_key: API key the requests are billed against
+        config: Optional provider config with rpm / tpm / max_concurrency overrides
+    """
+    key = (provider_name, api_key)
+    throttle = _throttles.get(key)
+    if throttle is None:
+        config = config or {}
+        throttle = ProviderThrottle(
+            rpm=_get_limit(provider_name, "rpm", config),
+            tpm=_get_limit(provider_name, "tpm", config),
+            max_concurrency=_get_limit(provider_name, "max_concurrency", config),
+            adaptive=not any(_is_configured(provider_name, name, config) for name in ("rpm", "tpm"))
+        )
+        _throttles[key] = throttle
+    return throttle
+
+
+def estimate_tokens(prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 0) -> int:
+    """Rough token estimate (~4 characters per token) for budgeting TPM."""
+    return (len(prompt) + len(system_prompt or "")) // 4 + max_tokens
@@ -0,0 +1,80 @@
+"""
+Prompt size limits for LLM providers.
+Rejects oversized prompts before they are serialized and sent (or billed).
+"""
+import asyncio
+import functools
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# transformers is optional - a chars/4 estimate is used if not available
+TRANSFORMERS_AVAILABLE = False
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    pass
+
+DEFAULT_MAX_INPUT_TOKENS = int(os.getenv("LLM_MAX_INPUT_TOKENS", "8192"))
+
+
+class PromptTooLongError(ValueError):
+    """Raised when a prompt exceeds the configured input token limit."""
+    pass
+
+
+@functools.lru_cache(maxsize=16)
+def _get_tokenizer(model: str):
+    """Load (once) the fast tokenizer for a HuggingFace model id, or None if unavailable."""
+    if not TRANSFORMERS_AVAILABLE:
+        return None
+    try:
+        return AutoTokenizer.from_pretrained(model, use_fast=True)
+    except Exception as e:
+        logger.debug(f"[Token Limits] No tokenizer for {model}, estimating: {e}")
+        return None
+
+
+def count_tokens(model: Optional[str], text: str) -> int:
+    """
+    Count tokens in text with the model's tokenizer when available,
+    otherwise estimate ~4 characters per token.
+    """
+    tokenizer = _get_tokenizer(model) if model else None
+    if tokenizer is None:
+        return len(text) // 4
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+async def check_prompt_size(
+    model: Optional[str],
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS
+) -> None:
+    """
+    Raise PromptTooLongError if system prompt + prompt exceed max_input_tokens.
+    
+    Args:
+        model: Model id used to pick a tokenizer (None to always estimate)
+        prompt: User prompt
+        system_prompt: System prompt
+        max_input_tokens: Input token limit
+    """
+    system_prompt = system_prompt or ""
+    # Every token covers at least one UTF-8 byte, so short prompts never need tokenizing
+    if len(prompt.encode()) + len(system_prompt.encode()) <= max_input_tokens:
+        return
+    
+    # Tokenizer loading/encoding is blocking work
+    system_tokens, prompt_tokens = await asyncio.to_thread(
+        lambda: (count_tokens(model, system_prompt), count_tokens(model, prompt))
+    )
+    if system_tokens + prompt_tokens > max_input_tokens:
+        raise PromptTooLongError(
+            f"Prompt too long: {system_tokens} system + {prompt_tokens} prompt tokens "
+            f"exceeds the {max_input_tokens} token input limit"
+        )
@@ -2,15 +2,23 @@
 LLM service with provider abstraction and tenant-aware configuration.
 Implements confidence scoring for Human-in-the-Loop workflow.
 """
+import asyncio
+import hashlib
+import json
 import os
 import logging
-from typing import Dict, List, Optional
+from bisect import bisect_left
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
 from sqlalchemy.orm import Session
 
 from app.models import KnowledgeBase, Message, Conversation, TenantConfiguration
-from app.services.rag_service import search_knowledge_base_vector
+from app.services import semantic_cache as response_cache
+from app.services.rag_service import generate_embedding, search_knowledge_base_vector
 from app.services.llm_providers.factory import get_provider
-from app.services.llm_providers.encryption import decrypt_llm_config
+from app.services.llm_providers.encryption import decrypt_llm_config, encrypt_llm_config, needs_key_migration
 from app.config import get_default_llm_config, get_tone_prompt
 
 logger = logging.getLogger(__name__)
@@ -25,9 +33,11 @@ except ImportError:
 
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
 AUTO_SEND_THRESHOLD = float(os.getenv("AUTO_SEND_THRESHOLD", "0.65"))
+# Providers whose warmup only opens a connection (no model load, no billed tokens)
+CONNECTION_WARMUP_PROVIDERS = {"openai"}
 
 
-def search_knowledge_base(query: str, db: Session, tenant_id: Optional[int] = None, embedding_model_name: Optional[str] = None) -> List[Dict]:
+def search_knowledge_base(query: str, db: Session, tenant_id: Optional[int] = None, embedding_model_name: Optional[str] = None, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
     """
     Search knowledge base using vector embeddings (with keyword fallback).
     
@@ -36,9 +46,38 @@ def search_knowledge_base(query: str, db: Session, tenant_id: Optional[int] = No
         db: Database session
         tenant_id: Deprecated - kept for backward compatibility
         embedding_model_name: Name of embedding model to use
+        query_embedding: Precomputed embedding of the query
     """
     # Use vector search (will fallback to keyword if embeddings unavailable)
-    return search_knowledge_base_vector(query, db, top_k=3, tenant_id=None, embedding_model_name=embedding_model_name)
+    return search_knowledge_base_vector(
+        query, db, top_k=3, tenant_id=None,
+        embedding_model_name=embedding_model_name, query_embedding=query_embedding
+    )
+
+
+async def asearch_knowledge_base(query: str, db: Session, embedding_model_name: Optional[str] = None, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
+    """
+    Async search_knowledge_base: embedding and Chroma work is CPU/IO-bound, so it runs
+    in a worker thread instead of blocking the event loop for other conversations.
+    """
+    return await asyncio.to_thread(
+        search_knowledge_base, query, db, None, embedding_model_name, query_embedding
+    )
+
+
+def _response_cache_namespace(settings: Dict) -> str:
+    """Hash every setting a generated answer depends on (keeps API keys out of cache keys)."""
+    parts = json.dumps(
+        [settings["provider"], settings["model"], settings["llm_config"], settings["tone"], settings["embedding_model"]],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.blake2b(parts.encode(), digest_size=16).hexdigest()
+
+
+# Similarity bucket bounds and the confidence assigned to each bucket (one more value than bounds)
+_CONFIDENCE_THRESHOLDS = (0.3, 0.5, 0.7)
+_CONFIDENCE_VALUES = (0.3, 0.4, 0.65, 0.85)
 
 
 def calculate_confidence_score(matched_articles: List[Dict], query: str) -> float:
@@ -53,19 +92,99 @@ def calculate_confidence_score(matched_articles: List[Dict], query: str) -> floa
     - No matches: 0.3 confidence
     """
     if not matched_articles:
-        return 0.3
+        return _CONFIDENCE_VALUES[0]
     
     # Use similarity if available (from vector search), otherwise match_score
-    best_score = matched_articles[0].get("similarity") or matched_articles[0].get("match_score", 0)
-    
-    if best_score > 0.7:
-        return 0.85
-    elif best_score > 0.5:
-        return 0.65
-    elif best_score > 0.3:
-        return 0.4
-    else:
-        return 0.3
+    best = matched_articles[0]
+    best_score = best["similarity"] if best.get("similarity") is not None else best.get("match_score", 0)
+    
+    # bisect_left keeps the bounds exclusive (a score of exactly 0.7 is "medium")
+    return _CONFIDENCE_VALUES[bisect_left(_CONFIDENCE_THRESHOLDS, best_score)]
+
+
+def _load_llm_settings(db: Session) -> Dict:
+    """
+    Load the active LLM settings (tenant config > env vars > defaults).
+    
+    Returns:
+        Dict with provider, model, llm_config, tone, auto_send_threshold,
+        embedding_model and source
+    """
+    # Load global configuration
+    tenant_config = db.query(TenantConfiguration).first()
+    
+    # Get configuration (tenant config > env vars > defaults)
+    default_config = get_default_llm_config()
+    
+    if tenant_config:
+        # Decrypt API keys from stored config
+        llm_config = decrypt_llm_config(tenant_config.llm_config) if tenant_config.llm_config else {}
+        return {
+            "provider": tenant_config.llm_provider or default_config["provider"],
+            "model": tenant_config.llm_model_name or default_config["model"],
+            "llm_config": llm_config,
+            "tone": tenant_config.tone or default_config["tone"],
+            "auto_send_threshold": tenant_config.auto_send_threshold or default_config["auto_send_threshold"],
+            "embedding_model": tenant_config.embedding_model or default_config.get("embedding_model"),
+            "source": "database",
+        }
+    
+    return {
+        "provider": default_config["provider"],
+        "model": default_config["model"],
+        "llm_config": {},
+        "tone": default_config["tone"],
+        "auto_send_threshold": default_config["auto_send_threshold"],
+        "embedding_model": default_config.get("embedding_model"),
+        "source": "defaults",
+    }
+
+
+def migrate_legacy_api_keys(db: Session) -> int:
+    """
+    Re-store legacy (unmarked) encrypted API keys with the enc:v1: marker.
+    Runs once on startup so request paths only ever read the configuration.
+    
+    Returns:
+        Number of configurations rewritten
+    """
+    migrated = 0
+    for tenant_config in db.query(TenantConfiguration).all():
+        if not needs_key_migration(tenant_config.llm_config):
+            continue
+        llm_config = decrypt_llm_config(tenant_config.llm_config)
+        # Only rewrite keys that actually decrypt
+        if llm_config.get("api_key"):
+            tenant_config.llm_config = encrypt_llm_config(llm_config)
+            migrated += 1
+    if migrated:
+        db.commit()
+    return migrated
+
+
+@lru_cache(maxsize=32)
+def _system_prompt(tone: str) -> str:
+    """Full system prompt for a tone (built once per tone)."""
+    return get_tone_prompt(tone) + "\n\nUse the following information to answer the customer's question. If the information provided doesn't fully answer the question, acknowledge this and offer to escalate to a human agent."
+
+
+def _build_prompts(tone: str, matched_articles: List[Dict], user_message: str) -> Tuple[str, str]:
+    """Build (system_prompt, user_prompt) with tone and knowledge base context."""
+    # Build context from knowledge base
+    context = ""
+    if matched_articles:
+        context = "Relevant information:\n\n" + "".join(
+            f"**{article['title']}**\n{article['content'][:300]}...\n\n"
+            for article in matched_articles[:2]  # Use top 2
+        )
+    
+    # Build system prompt with tone
+    system_prompt = _system_prompt(tone)
+    
+    # Build user prompt with context
+    user_prompt = f"{context}\n\nCustomer Question: {user_message}\n\nProvide a helpful, concise response."
+    
+    return system_prompt, user_prompt
 
 
 async def generate_ai_response(
@@ -85,28 +204,14 @@ async def generate_ai_response(
         tenant_id: Deprecated - kept for backward compatibility
     """
     
-    # Load global configuration
-    tenant_config = db.query(TenantConfiguration).first()
-    
-    # Get configuration (tenant config > env vars > defaults)
-    default_config = get_default_llm_config()
-    config_source = "database" if tenant_config else "defaults"
-    
-    if tenant_config:
-        llm_provider = tenant_config.llm_provider or default_config["provider"]
-        llm_model = tenant_config.llm_model_name or default_config["model"]
-        # Decrypt API keys from stored config
-        llm_config = decrypt_llm_config(tenant_config.llm_config) if tenant_config.llm_config else {}
-        tone = tenant_config.tone or default_config["tone"]
-        auto_send_threshold = tenant_config.auto_send_threshold or default_config["auto_send_threshold"]
-        embedding_model_name = tenant_config.embedding_model or default_config.get("embedding_model")
-    else:
-        llm_provider = default_config["provider"]
-        llm_model = default_config["model"]
-        llm_config = {}
-        tone = default_config["tone"]
-        auto_send_threshold = default_config["auto_send_threshold"]
-        embedding_model_name = default_config.get("embedding_model")
+    settings = _load_llm_settings(db)
+    llm_provider = settings["provider"]
+    llm_model = settings["model"]
+    llm_config = settings["llm_config"]
+    tone = settings["tone"]
+    auto_send_threshold = settings["auto_send_threshold"]
+    embedding_model_name = settings["embedding_model"]
+    config_source = settings["source"]
     
     # Log configuration details
     logger.info(
@@ -115,19 +220,27 @@ async def generate_ai_response(
         f"Conversation ID: {conversation_id}"
     )
     
+    # Answer repeated / near-duplicate questions from the response cache
+    query_embedding = None
+    cache_namespace = None
+    if response_cache.is_enabled():
+        cache_namespace = _response_cache_namespace(settings)
+        query_embedding = await asyncio.to_thread(generate_embedding, user_message, embedding_model_name)
+        cached = response_cache.lookup(cache_namespace, user_message, query_embedding)
+        if cached is not None:
+            logger.info(f"[LLM Service] Response cache hit - Conversation ID: {conversation_id}")
+            cached["auto_send_threshold"] = auto_send_threshold
+            cached["should_auto_send"] = cached["confidence_score"] >= auto_send_threshold
+            return cached
+    
     # Search knowledge base with tenant's embedding model
-    matched_articles = search_knowledge_base(user_message, db, tenant_id=None, embedding_model_name=embedding_model_name)
+    matched_articles = await asearch_knowledge_base(
+        user_message, db, embedding_model_name=embedding_model_name, query_embedding=query_embedding
+    )
     
     # Calculate confidence
     confidence = calculate_confidence_score(matched_articles, user_message)
     
-    # Build context from knowledge base
-    context = ""
-    if matched_articles:
-        context = "Relevant information:\n\n"
-        for article in matched_articles[:2]:  # Use top 2
-            context += f"**{article['title']}**\n{article['content'][:300]}...\n\n"
-    
     # Get LLM provider
     provider_config = {
         "model": llm_model,
@@ -146,7 +259,7 @@ async def generate_ai_response(
     
     # Log provider creation status
     if provider:
-        provider_available = provider.is_available()
+        provider_available = await provider.check_available()
         # Try to get the model the provider is actually using
         provider_model = final_model
         if hasattr(provider, 'model'):
@@ -169,19 +282,14 @@ async def generate_ai_response(
     actual_model_used = final_model
     model_validation_status = "unknown"
     
-    if provider and provider.is_available():
+    if provider and await provider.check_available():
         try:
             logger.info(
                 f"[LLM Service] Generating response - Provider: {llm_provider}, "
                 f"Model: {final_model}, Provider Type: {type(provider).__name__}"
             )
             
-            # Build system prompt with tone
-            system_prompt = get_tone_prompt(tone)
-            system_prompt += "\n\nUse the following information to answer the customer's question. If the information provided doesn't fully answer the question, acknowledge this and offer to escalate to a human agent."
-            
-            # Build user prompt with context
-            user_prompt = f"{context}\n\nCustomer Question: {user_message}\n\nProvide a helpful, concise response."
+            system_prompt, user_prompt = _build_prompts(tone, matched_articles, user_message)
             
             response = await provider.generate_response(
                 prompt=user_prompt,
@@ -226,7 +334,7 @@ async def generate_ai_response(
         reasoning = f"Fallback (provider {llm_provider} unavailable)"
         model_validation_status = "unavailable"
     
-    return {
+    result = {
         "response": response,
         "confidence_score": confidence,
         "matched_articles": matched_articles,
@@ -238,6 +346,88 @@ async def generate_ai_response(
         "actual_model_used": actual_model_used,
         "model_validation_status": model_validation_status
     }
+    
+    # Only cache real model output, never fallbacks
+    if cache_namespace is not None and model_validation_status == "success":
+        response_cache.store(cache_namespace, user_message, query_embedding, result)
+    
+    return result
+
+
+async def stream_ai_response(
+    conversation_id: int,
+    user_message: str,
+    db: Session
+) -> AsyncIterator[str]:
+    """
+    Stream an AI response token-by-token using the configured LLM provider.
+    Falls back to the rule-based response if the provider is unavailable or fails
+    before producing any output.
+    
+    Args:
+        conversation_id: Conversation ID
+        user_message: User's message
+        db: Database session
+    
+    Yields:
+        Response text chunks
+    """
+    settings = _load_llm_settings(db)
+    llm_provider = settings["provider"]
+    
+    logger.info(
+        f"[LLM Service] Starting streamed generation - Provider: {llm_provider}, "
+        f"Model: {settings['model']}, Conversation ID: {conversation_id}"
+    )
+    
+    matched_articles = await asearch_knowledge_base(user_message, db, embedding_model_name=settings["embedding_model"])
+    system_prompt, user_prompt = _build_prompts(settings["tone"], matched_articles, user_message)
+    provider_config = {"model": settings["model"], **settings["llm_config"]}
+    provider = get_provider(llm_provider, provider_config)
+    
+    if not provider or not await provider.check_available():
+        logger.warning(f"[LLM Service] Provider unavailable, using fallback - Provider: {llm_provider}")
+        yield generate_fallback_response(user_message, matched_articles)
+        return
+    
+    started = False
+    try:
+        async for chunk in provider.stream_response(
+            prompt=user_prompt,
+            system_prompt=system_prompt,
+            config=provider_config
+        ):
+            started = True
+            yield chunk
+    except Exception as e:
+        logger.error(
+            f"[LLM Service] Streamed generation failed - Provider: {llm_provider}, Error: {str(e)}",
+            exc_info=True
+        )
+        # Output already sent can't be retracted; only fall back if nothing was streamed
+        if not started:
+            yield generate_fallback_response(user_message, matched_articles)
+
+
+async def warmup_llm_provider(db: Session, load_models: bool = True) -> None:
+    """
+    Warm up the configured LLM provider (loads cold models before user traffic).
+    
+    Args:
+        db: Database session
+        load_models: Also warm providers whose warmup loads a model; when False only
+            connection-only warmups (CONNECTION_WARMUP_PROVIDERS) run
+    """
+    settings = _load_llm_settings(db)
+    if not load_models and settings["provider"] not in CONNECTION_WARMUP_PROVIDERS:
+        return
+    provider = get_provider(settings["provider"], {"model": settings["model"], **settings["llm_config"]})
+    if not provider:
+        logger.warning(f"[LLM Service] Warmup skipped, provider not found - Provider: {settings['provider']}")
+        return
+    
+    logger.info(f"[LLM Service] Warming up - Provider: {settings['provider']}, Model: {settings['model']}")
+    await provider.warmup()
 
 
 # Keep for backward compatibility
@@ -2,28 +2,69 @@
 RAG service for vector embeddings and semantic search.
 Uses sentence-transformers for embeddings and ChromaDB for vector storage.
 """
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Optional
 
 import numpy as np
 from sqlalchemy.orm import Session
 
-# Try to import sentence-transformers, fallback if not available
-EMBEDDING_AVAILABLE = False
-try:
-    import chromadb
-    from chromadb.config import Settings
-    from sentence_transformers import SentenceTransformer
-    EMBEDDING_AVAILABLE = True
-except ImportError:
-    print("⚠️  sentence-transformers or chromadb not available, using fallback")
+from app.services import semantic_cache as response_cache
+
+# Embedding stack modules, imported on first use by is_embedding_available()
+# (sentence-transformers pulls in PyTorch, which would otherwise slow every cold start)
+chromadb = None
+torch = None
+Settings = None
+SentenceTransformer = None
+
+
+@lru_cache(maxsize=None)
+def is_embedding_available() -> bool:
+    """Import sentence-transformers and chromadb on first call; fall back if not installed."""
+    global chromadb, torch, Settings, SentenceTransformer
+    try:
+        import chromadb
+        import torch
+        from chromadb.config import Settings
+        from sentence_transformers import SentenceTransformer
+        return True
+    except ImportError:
+        print("⚠️  sentence-transformers or chromadb not available, using fallback")
+        return False
 
 # Initialize embedding models (lazy loading, cached per model name)
 _embedding_models = {}  # Cache for multiple models: {model_name: SentenceTransformer}
 _chroma_client = None
 _chroma_collections = {}  # Cache for tenant-specific collections
+_chroma_lock = threading.Lock()
+
+# Keyword search index: (vocabulary {word: postings array of row indices}, article ids)
+_kb_index = None
+_kb_index_lock = threading.Lock()
+
+# Embedding LRU: (model_name, blake2b digest of text) -> read-only float32 vector
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+_embedding_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+# Optional shared second tier in Redis: survives restarts and is shared by all workers
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+REDIS_URL = os.getenv("REDIS_URL")
+_embedding_redis = None
+try:
+    if REDIS_URL:
+        import redis
+        _embedding_redis = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+except ImportError:
+    pass
 
 DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "int8" applies dynamic int8 quantization to Linear layers when running on CPU
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "").lower()
 
 
 def get_embedding_model(model_name: Optional[str] = None):
@@ -37,7 +78,7 @@ def get_embedding_model(model_name: Optional[str] = None):
         SentenceTransformer model or None if not available
     """
     global _embedding_models
-    if not EMBEDDING_AVAILABLE:
+    if not is_embedding_available():
         return None
     
     # Use provided model name or default
@@ -50,7 +91,7 @@ def get_embedding_model(model_name: Optional[str] = None):
     # Load model
     try:
         print(f"Loading embedding model: {model_name}")
-        model = SentenceTransformer(model_name)
+        model = _load_embedding_model(model_name)
         _embedding_models[model_name] = model
         return model
     except Exception as e:
@@ -61,6 +102,26 @@ def get_embedding_model(model_name: Optional[str] = None):
         return None
 
 
+def _load_embedding_model(model_name: str):
+    """
+    Load a SentenceTransformer with reduced-precision weights where it helps:
+    fp16 on GPU, optional dynamic int8 Linear layers on CPU (fp16 matmuls are slow on most CPUs).
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(model_name, device=device)
+    model.eval()
+    
+    if device == "cuda":
+        model.half()
+    elif EMBEDDING_QUANTIZATION == "int8":
+        try:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            print(f"Quantized embedding model {model_name} to int8")
+        except Exception as e:
+            print(f"int8 quantization failed for {model_name}, using fp32: {e}")
+    return model
+
+
 def get_chroma_collection(tenant_id: Optional[int] = None):
     """
     Initialize and return ChromaDB collection.
@@ -68,37 +129,37 @@ def get_chroma_collection(tenant_id: Optional[int] = None):
     Args:
         tenant_id: Deprecated - kept for backward compatibility
     """
-    global _chroma_client, _chroma_collections
-    if not EMBEDDING_AVAILABLE:
+    global _chroma_client
+    if not is_embedding_available():
         return None
     
-    if _chroma_client is None:
-        # Use persistent storage in backend directory
-        chroma_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "chroma_db")
-        os.makedirs(chroma_path, exist_ok=True)
-        _chroma_client = chromadb.PersistentClient(path=chroma_path, settings=Settings(anonymized_telemetry=False))
-    
     # Use global collection name
     collection_name = "knowledge_base"
     
-    # Check cache
-    if collection_name in _chroma_collections:
-        return _chroma_collections[collection_name]
+    # Check cache before touching Chroma
+    collection = _chroma_collections.get(collection_name)
+    if collection is not None:
+        return collection
     
-    # Get or create collection
-    try:
-        collection = _chroma_client.get_collection(collection_name)
-    except:
-        collection = _chroma_client.create_collection(
+    with _chroma_lock:
+        if collection_name in _chroma_collections:
+            return _chroma_collections[collection_name]
+        
+        if _chroma_client is None:
+            # Use persistent storage in backend directory
+            chroma_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "chroma_db")
+            os.makedirs(chroma_path, exist_ok=True)
+            _chroma_client = chromadb.PersistentClient(path=chroma_path, settings=Settings(anonymized_telemetry=False))
+        
+        collection = _chroma_client.get_or_create_collection(
             name=collection_name,
             metadata={"hnsw:space": "cosine"}
         )
-    
-    _chroma_collections[collection_name] = collection
-    return collection
+        _chroma_collections[collection_name] = collection
+        return collection
 
 
-def generate_embedding(text: str, model_name: Optional[str] = None) -> Optional[List[float]]:
+def generate_embedding(text: str, model_name: Optional[str] = None) -> Optional[np.ndarray]:
     """
     Generate vector embedding for text.
     
@@ -107,9 +168,89 @@ def generate_embedding(text: str, model_name: Optional[str] = None) -> Optional[
         model_name: Name of the embedding model to use. If None, uses default.
     
     Returns:
-        Embedding vector or None if embeddings are not available.
+        Read-only float32 embedding vector or None if embeddings are not available.
     """
-    if not EMBEDDING_AVAILABLE:
+    if not is_embedding_available():
+        return None
+    
+    return _encode_cached(model_name or DEFAULT_EMBEDDING_MODEL, text)
+
+
+def _encode_cached(model_name: str, text: str) -> Optional[np.ndarray]:
+    """Encode text, skipping the model forward pass for recently seen texts."""
+    digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    key = (model_name, digest)
+    with _embedding_cache_lock:
+        embedding = _embedding_cache.get(key)
+        if embedding is not None:
+            _embedding_cache.move_to_end(key)
+            return embedding
+    
+    # Keys are partitioned by model name, which also fixes the vector dimension
+    redis_key = f"emb:{model_name}:{digest.hex()}"
+    embedding = _redis_get_embedding(redis_key)
+    if embedding is None:
+        model = get_embedding_model(model_name)
+        if model is None:
+            return None
+        
+        try:
+            with torch.inference_mode():
+                embedding = np.asarray(model.encode(text, normalize_embeddings=True), dtype=np.float32)
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            return None
+        _redis_set_embedding(redis_key, embedding)
+    
+    embedding.setflags(write=False)
+    with _embedding_cache_lock:
+        _embedding_cache[key] = embedding
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    return embedding
+
+
+def _redis_get_embedding(key: str) -> Optional[np.ndarray]:
+    """Fetch a float32 vector from the shared Redis tier (None if missing or unreachable)."""
+    if _embedding_redis is None:
+        return None
+    try:
+        data = _embedding_redis.get(key)
+    except Exception as e:
+        print(f"Embedding cache read failed: {e}")
+        return None
+    return np.frombuffer(data, dtype=np.float32).copy() if data else None
+
+
+def _redis_set_embedding(key: str, embedding: np.ndarray):
+    """Store a float32 vector (raw 4*D bytes) in the shared Redis tier."""
+    if _embedding_redis is None:
+        return
+    try:
+        _embedding_redis.setex(key, EMBEDDING_CACHE_TTL, embedding.tobytes())
+    except Exception as e:
+        print(f"Embedding cache write failed: {e}")
+
+
+def clear_embedding_cache():
+    """Drop all in-process cached embeddings (Redis entries expire via TTL)."""
+    with _embedding_cache_lock:
+        _embedding_cache.clear()
+
+
+def generate_embeddings_batch(texts: List[str], model_name: Optional[str] = None, batch_size: int = 64):
+    """
+    Generate vector embeddings for many texts in batched encoder passes.
+    
+    Args:
+        texts: Texts to embed
+        model_name: Name of the embedding model to use. If None, uses default.
+        batch_size: Number of texts per encoder forward pass
+    
+    Returns:
+        2D float32 array of L2-normalized embeddings (one row per text) or None if not available.
+    """
+    if not is_embedding_available():
         return None
     
     model = get_embedding_model(model_name)
@@ -117,29 +258,44 @@ def generate_embedding(text: str, model_name: Optional[str] = None) -> Optional[
         return None
     
     try:
-        embedding = model.encode(text, normalize_embeddings=True)
-        return embedding.tolist()
+        with torch.inference_mode():
+            embeddings = model.encode(
+                texts,
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+        return np.asarray(embeddings, dtype=np.float32)
     except Exception as e:
-        print(f"Error generating embedding: {e}")
+        print(f"Error generating embeddings: {e}")
         return None
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """Calculate cosine similarity between two vectors."""
-    vec1_array = np.array(vec1)
-    vec2_array = np.array(vec2)
+    """
+    Calculate cosine similarity between two vectors.
     
-    dot_product = np.dot(vec1_array, vec2_array)
-    norm1 = np.linalg.norm(vec1_array)
-    norm2 = np.linalg.norm(vec2_array)
+    Inputs must be unit-norm (generate_embedding normalizes), so this is a plain dot product.
+    """
+    return float(np.dot(np.asarray(vec1, dtype=np.float32), np.asarray(vec2, dtype=np.float32)))
+
+
+def cosine_similarity_batch(query, matrix) -> np.ndarray:
+    """
+    Calculate cosine similarity of one vector against many in a single matrix-vector product.
     
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
+    Args:
+        query: Unit-norm vector of shape (D,)
+        matrix: Unit-norm vectors of shape (N, D)
     
-    return float(dot_product / (norm1 * norm2))
+    Returns:
+        float32 array of shape (N,)
+    """
+    return np.asarray(matrix, dtype=np.float32) @ np.asarray(query, dtype=np.float32)
 
 
-def search_knowledge_base_vector(query: str, db: Session, top_k: int = 3, tenant_id: Optional[int] = None, embedding_model_name: Optional[str] = None) -> List[Dict]:
+def search_knowledge_base_vector(query: str, db: Session, top_k: int = 3, tenant_id: Optional[int] = None, embedding_model_name: Optional[str] = None, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
     """
     Search knowledge base using vector similarity.
     Falls back to keyword search if embeddings are not available.
@@ -150,8 +306,9 @@ def search_knowledge_base_vector(query: str, db: Session, top_k: int = 3, tenant
         top_k: Number of results to return
         tenant_id: Deprecated - kept for backward compatibility
         embedding_model_name: Name of embedding model to use. If None, uses default.
+        query_embedding: Precomputed embedding of the query (skips re-embedding)
     """
-    if not EMBEDDING_AVAILABLE:
+    if not is_embedding_available():
         # Fallback to keyword search
         return search_knowledge_base_keyword(query, db, top_k, tenant_id=None)
     
@@ -160,14 +317,15 @@ def search_knowledge_base_vector(query: str, db: Session, top_k: int = 3, tenant
         return search_knowledge_base_keyword(query, db, top_k, tenant_id=None)
     
     # Generate query embedding
-    query_embedding = generate_embedding(query, model_name=embedding_model_name)
+    if query_embedding is None:
+        query_embedding = generate_embedding(query, model_name=embedding_model_name)
     if query_embedding is None:
         return search_knowledge_base_keyword(query, db, top_k, tenant_id=None)
     
     try:
-        # Search in ChromaDB
+        # Search in ChromaDB (lists at the Chroma boundary: 0.4.x rejects ndarrays)
         results = collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=[np.asarray(query_embedding, dtype=np.float32).tolist()],
             n_results=top_k
         )
         
@@ -176,12 +334,18 @@ def search_knowledge_base_vector(query: str, db: Session, top_k: int = 3, tenant
         if results['ids'] and len(results['ids'][0]) > 0:
             from app.models import KnowledgeBase
             
-            for i, article_id in enumerate(results['ids'][0]):
-                # Get article from database
-                article = db.query(KnowledgeBase).filter(KnowledgeBase.id == int(article_id)).first()
-                
+            article_ids = [int(article_id) for article_id in results['ids'][0]]
+            distances = results['distances'][0] if results.get('distances') else [0.0] * len(article_ids)
+            
+            # Fetch all hits in one query, then keep Chroma's ranking order
+            articles = {
+                article.id: article
+                for article in db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(article_ids)).all()
+            }
+            
+            for article_id, distance in zip(article_ids, distances):
+                article = articles.get(article_id)
                 if article:
-                    distance = results['distances'][0][i] if 'distances' in results else 0.0
                     similarity = 1.0 - distance  # Convert distance to similarity
                     
                     matched_articles.append({
@@ -216,29 +380,86 @@ def search_knowledge_base_keyword(query: str, db: Session, top_k: int = 3, tenan
     """
     from app.models import KnowledgeBase
     
-    query_lower = query.lower()
-    all_articles = db.query(KnowledgeBase).all()
+    query_words = set(query.lower().split())
+    if not query_words:
+        return []
+    
+    postings, article_ids = _get_keyword_index(db)
+    hits = [postings[word] for word in query_words if word in postings]
+    if not hits:
+        return []
+    
+    # Number of distinct query words per article, for all articles at once
+    common_counts = np.bincount(np.concatenate(hits), minlength=len(article_ids))
+    candidates = np.flatnonzero(common_counts)
+    if len(candidates) > top_k:
+        candidates = candidates[np.argpartition(-common_counts[candidates], top_k - 1)[:top_k]]
+    # Highest score first, ties in table order
+    candidates = candidates[np.lexsort((candidates, -common_counts[candidates]))]
+    
+    winner_ids = [int(article_ids[i]) for i in candidates]
+    articles = {
+        article.id: article
+        for article in db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(winner_ids)).all()
+    }
     
     matched_articles = []
-    for article in all_articles:
-        article_text = f"{article.title} {article.content} {article.tags}".lower()
-        query_words = set(query_lower.split())
-        article_words = set(article_text.split())
-        common_words = query_words.intersection(article_words)
-        
-        if common_words:
-            match_score = len(common_words) / len(query_words) if query_words else 0
-            matched_articles.append({
-                "id": article.id,
-                "title": article.title,
-                "content": article.content,
-                "category": article.category,
-                "match_score": match_score,
-                "similarity": match_score
-            })
+    for i, article_id in zip(candidates, winner_ids):
+        article = articles.get(article_id)
+        if article is None:
+            continue
+        match_score = int(common_counts[i]) / len(query_words)
+        matched_articles.append({
+            "id": article.id,
+            "title": article.title,
+            "content": article.content,
+            "category": article.category,
+            "match_score": match_score,
+            "similarity": match_score
+        })
+    return matched_articles
+
+
+def _get_keyword_index(db: Session):
+    """
+    Build (once) an inverted index of article words for keyword search.
+    
+    Returns:
+        Tuple of ({word: int array of row indices}, article ids array)
+    """
+    global _kb_index
+    index = _kb_index
+    if index is not None:
+        return index
+    
+    from app.models import KnowledgeBase
     
-    matched_articles.sort(key=lambda x: x["match_score"], reverse=True)
-    return matched_articles[:top_k]
+    with _kb_index_lock:
+        if _kb_index is not None:
+            return _kb_index
+        
+        rows = db.query(
+            KnowledgeBase.id, KnowledgeBase.title, KnowledgeBase.content, KnowledgeBase.tags
+        ).order_by(KnowledgeBase.id).all()
+        
+        postings: Dict[str, List[int]] = {}
+        for row_index, (_, title, content, tags) in enumerate(rows):
+            for word in set(f"{title} {content} {tags}".lower().split()):
+                postings.setdefault(word, []).append(row_index)
+        
+        _kb_index = (
+            {word: np.asarray(rows_with_word, dtype=np.int32) for word, rows_with_word in postings.items()},
+            np.asarray([row[0] for row in rows], dtype=np.int64)
+        )
+        return _kb_index
+
+
+def invalidate_knowledge_base_caches():
+    """Drop caches derived from article text (call after any knowledge base change)."""
+    global _kb_index
+    with _kb_index_lock:
+        _kb_index = None
+    response_cache.clear()
 
 
 def add_article_to_vector_db(article_id: int, title: str, content: str, db: Session, tenant_id: Optional[int] = None, embedding_model_name: Optional[str] = None):
@@ -253,7 +474,17 @@ def add_article_to_vector_db(article_id: int, title: str, content: str, db: Sess
         tenant_id: Deprecated - kept for backward compatibility
         embedding_model_name: Name of embedding model to use. If None, uses default.
     """
-    if not EMBEDDING_AVAILABLE:
+    try:
+        _upsert_article_embedding(article_id, title, content, db, embedding_model_name)
+    finally:
+        # Cached answers and the keyword index may reflect the old article text. Dropped only
+        # after the commit (callers commit the text first), so a concurrent search can't
+        # rebuild the index from pre-commit rows
+        invalidate_knowledge_base_caches()
+
+
+def _upsert_article_embedding(article_id: int, title: str, content: str, db: Session, embedding_model_name: Optional[str]):
+    if not is_embedding_available():
         return
     
     collection = get_chroma_collection(tenant_id=None)
@@ -266,12 +497,14 @@ def add_article_to_vector_db(article_id: int, title: str, content: str, db: Sess
     
     if embedding is None:
         return
+    # Chroma 0.4.x and the JSON column both need a plain list
+    embedding_list = embedding.tolist()
     
     try:
         # Add to ChromaDB
         collection.upsert(
             ids=[str(article_id)],
-            embeddings=[embedding],
+            embeddings=[embedding_list],
             documents=[article_text],
             metadatas=[{"article_id": article_id, "title": title}]
         )
@@ -280,17 +513,72 @@ def add_article_to_vector_db(article_id: int, title: str, content: str, db: Sess
         from app.models import KnowledgeBase
         article = db.query(KnowledgeBase).filter_by(id=article_id).first()
         if article:
-            article.embedding = embedding
+            article.embedding = embedding_list
             db.commit()
     except Exception as e:
         print(f"Error adding article to vector DB: {e}")
 
 
+def add_articles_to_vector_db(articles: List, db: Session, embedding_model_name: Optional[str] = None) -> int:
+    """
+    Add or update many articles in the vector database at once.
+    Embeds all texts in batched encoder passes and writes them with one Chroma upsert
+    and one bulk database update, instead of one of each per article.
+    
+    Args:
+        articles: KnowledgeBase rows (must have ids, i.e. be flushed)
+        db: Database session
+        embedding_model_name: Name of embedding model to use. If None, uses default.
+    
+    Returns:
+        Number of articles embedded
+    
+    Knowledge base caches are dropped after this function's commit; callers that commit
+    new articles themselves must call invalidate_knowledge_base_caches() after that commit.
+    """
+    if not articles or not is_embedding_available():
+        return 0
+    
+    collection = get_chroma_collection(tenant_id=None)
+    if collection is None:
+        return 0
+    
+    texts = [f"{article.title} {article.content}" for article in articles]
+    embeddings = generate_embeddings_batch(texts, model_name=embedding_model_name)
+    if embeddings is None:
+        return 0
+    # Chroma 0.4.x and the JSON column both need plain lists; convert once at the boundary
+    embedding_lists = np.asarray(embeddings, dtype=np.float32).tolist()
+    
+    try:
+        collection.upsert(
+            ids=[str(article.id) for article in articles],
+            embeddings=embedding_lists,
+            documents=texts,
+            metadatas=[{"article_id": article.id, "title": article.title} for article in articles]
+        )
+        
+        # Also update embeddings in Supabase PostgreSQL in one statement batch
+        from app.models import KnowledgeBase
+        db.bulk_update_mappings(
+            KnowledgeBase,
+            [{"id": article.id, "embedding": embedding} for article, embedding in zip(articles, embedding_lists)]
+        )
+        db.commit()
+        invalidate_knowledge_base_caches()
+        return len(articles)
+    except Exception as e:
+        print(f"Error adding articles to vector DB: {e}")
+        return 0
+
+
 def initialize_vector_db(db: Session):
     """
     Initialize vector database with existing knowledge base articles.
     """
-    if not EMBEDDING_AVAILABLE:
+    invalidate_knowledge_base_caches()
+    
+    if not is_embedding_available():
         return
     
     from app.models import KnowledgeBase
@@ -302,20 +590,19 @@ def initialize_vector_db(db: Session):
         return
     
     try:
-        # Clear existing collection
-        try:
-            _chroma_client.delete_collection("knowledge_base")
-        except:
-            pass
-        
-        _chroma_collection = _chroma_client.create_collection(
-            name="knowledge_base",
-            metadata={"hnsw:space": "cosine"}
-        )
+        with _chroma_lock:
+            # Clear existing collection
+            try:
+                _chroma_client.delete_collection("knowledge_base")
+            except:
+                pass
+            
+            _chroma_collections["knowledge_base"] = _chroma_client.create_collection(
+                name="knowledge_base",
+                metadata={"hnsw:space": "cosine"}
+            )
         
-        # Add all articles
-        for article in articles:
-            add_article_to_vector_db(article.id, article.title, article.content, db)
+        add_articles_to_vector_db(articles, db)
         
         print(f"✅ Initialized vector DB with {len(articles)} articles")
     except Exception as e:
@@ -7,7 +7,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app.models import TrainingData, Feedback, Message, KnowledgeBase
-from app.services.rag_service import add_article_to_vector_db, initialize_vector_db
+from app.services.rag_service import add_articles_to_vector_db, initialize_vector_db
 from app.services.router_agent import INTENT_EXAMPLES
 
 
@@ -89,9 +89,7 @@ def process_retraining(db: Session) -> Dict:
                 if message and message.matched_articles:  # This would need to be stored
                     # Re-embed knowledge articles (simplified - in production would track which articles)
                     articles = db.query(KnowledgeBase).all()
-                    for article in articles:
-                        add_article_to_vector_db(article.id, article.title, article.content, db)
-                        results["knowledge_articles_updated"] += 1
+                    results["knowledge_articles_updated"] += add_articles_to_vector_db(articles, db)
         
         # Step 3: Generate few-shot examples (store in a simple format)
         # In production, would update LLM prompt templates
@@ -2,8 +2,31 @@
 Router Agent - Classifies user intent and routes to appropriate agent.
 Uses embedding similarity for few-shot intent classification.
 """
+import os
+import re
+import threading
+from collections import OrderedDict
 from typing import Dict, Optional, List
-from app.services.rag_service import generate_embedding, cosine_similarity, EMBEDDING_AVAILABLE
+
+import numpy as np
+
+from app.services.rag_service import generate_embedding, generate_embeddings_batch, is_embedding_available
+
+# pyahocorasick is optional - per-keyword substring scans are used if not available
+AHOCORASICK_AVAILABLE = False
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    pass
+
+# Numba is optional - intent scoring falls back to numpy if not available
+NUMBA_AVAILABLE = False
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    pass
 
 # Intent categories
 INTENT_CATEGORIES = [
@@ -147,55 +170,266 @@ INTENT_EXAMPLES = {
 }
 
 
+# Keyword patterns for the fallback classifier, weighted by tier (built once at import)
+_KEYWORD_PATTERNS = {
+    "order_inquiry": {
+        "strong": ("order #", "tracking", "track order", "order status", "where is my order"),
+        "medium": ("order", "shipment", "delivery", "package"),
+        "weak": ("cancel", "modify", "change order")
+    },
+    "technical_support": {
+        "strong": ("not working", "error message", "can't log", "won't load", "keeps crashing"),
+        "medium": ("error", "bug", "crash", "broken", "login issue"),
+        "weak": ("help", "problem", "issue", "trouble")
+    },
+    "complaint": {
+        "strong": ("file a complaint", "very disappointed", "this is unacceptable", "terrible service"),
+        "medium": ("complaint", "unhappy", "disappointed", "frustrated", "angry"),
+        "weak": ("bad", "damaged", "wrong", "defective", "poor")
+    },
+    "faq": {
+        "strong": ("return policy", "refund policy", "shipping cost", "business hours"),
+        "medium": ("policy", "how do i", "what is", "do you have", "can i"),
+        "weak": ("return", "refund", "shipping", "warranty")
+    },
+}
+
+# Points per keyword tier
+_TIER_WEIGHTS = {"strong": 1.0, "medium": 0.5, "weak": 0.2}
+
+
+def _build_keyword_automaton():
+    """Compile every keyword into one Aho-Corasick automaton: keyword -> [(intent, weight)]."""
+    targets: Dict[str, List] = {}
+    for intent, patterns in _KEYWORD_PATTERNS.items():
+        for tier, weight in _TIER_WEIGHTS.items():
+            for keyword in patterns[tier]:
+                targets.setdefault(keyword, []).append((intent, weight))
+    automaton = ahocorasick.Automaton()
+    for keyword, keyword_targets in targets.items():
+        automaton.add_word(keyword, (keyword, tuple(keyword_targets)))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton() if AHOCORASICK_AVAILABLE else None
+
+
+def _keyword_scores(user_lower: str) -> Dict[str, float]:
+    """Sum tier weights of the distinct keywords found in the message, per intent."""
+    scores = dict.fromkeys(_KEYWORD_PATTERNS, 0.0)
+    if _KEYWORD_AUTOMATON is not None:
+        # One pass over the message finds every keyword, overlapping ones included
+        found = {value for _, value in _KEYWORD_AUTOMATON.iter(user_lower)}
+        for _, keyword_targets in found:
+            for intent, weight in keyword_targets:
+                scores[intent] += weight
+        return scores
+    
+    for intent, patterns in _KEYWORD_PATTERNS.items():
+        for tier, weight in _TIER_WEIGHTS.items():
+            scores[intent] += sum(weight for keyword in patterns[tier] if keyword in user_lower)
+    return scores
+
+
+# Greetings answered as "general" when the message is short
+_GREETINGS = ("hello", "hi", "hey", "good morning", "good afternoon")
+
+# Messages that are nothing but a greeting / thanks / goodbye never need the embedding model
+_GREETING_RE = re.compile(
+    r"^(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you|bye|goodbye)"
+    r"( there| so much| very much)?[\s!.,]*$"
+)
+# Keyword results at or above this confidence are trusted without embeddings
+KEYWORD_SHORTCUT_CONFIDENCE = 0.8
+
+# Lowercased once at import; embedded on the first classification
+_INTENT_EXAMPLES_LOWER = {
+    intent: tuple(example.lower() for example in examples)
+    for intent, examples in INTENT_EXAMPLES.items()
+}
+
+
+# Intent example embeddings, computed once on first classification:
+# all examples stacked into one (n_examples, dim) float32 matrix; intent i owns rows
+# _intent_offsets[i]:_intent_offsets[i + 1]
+_intent_matrix: Optional[np.ndarray] = None
+_intent_names: List[str] = []
+_intent_offsets: np.ndarray = np.zeros(1, dtype=np.int64)
+_intent_embeddings_lock = threading.Lock()
+
+# Embedding-scored results for repeated messages: normalized message -> result.
+# Keyword fallbacks are never stored, so a message classified before the model
+# was available gets re-scored once it is.
+INTENT_CACHE_MAX_SIZE = 1024
+_intent_cache: "OrderedDict[str, Dict]" = OrderedDict()
+_intent_cache_lock = threading.Lock()
+
+# "int8" stores the example matrix as int8 (unit vectors scaled by 127): 4x less memory
+# per loaded example set, at a cosine error of well under 0.01
+INTENT_EMBEDDING_QUANTIZATION = os.getenv("INTENT_EMBEDDING_QUANTIZATION", "").lower()
+_INT8_SCALE = 127.0
+
+
+def _ensure_intent_embeddings() -> Optional[np.ndarray]:
+    """Embed INTENT_EXAMPLES once and cache them as a single L2-normalized matrix."""
+    global _intent_matrix, _intent_names, _intent_offsets
+    if _intent_matrix is not None:
+        return _intent_matrix
+    
+    with _intent_embeddings_lock:
+        if _intent_matrix is not None:
+            return _intent_matrix
+        
+        # Embed every example in one batched encode
+        texts = [example for examples in _INTENT_EXAMPLES_LOWER.values() for example in examples]
+        matrix = generate_embeddings_batch(texts)
+        # Don't cache a failure (model failed to load); retry on the next call
+        if matrix is None:
+            return None
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        
+        names = [intent for intent, examples in _INTENT_EXAMPLES_LOWER.items() if examples]
+        offsets = np.cumsum([0] + [len(_INTENT_EXAMPLES_LOWER[intent]) for intent in names], dtype=np.int64)
+        if INTENT_EMBEDDING_QUANTIZATION == "int8":
+            matrix = np.round(matrix * _INT8_SCALE).astype(np.int8)
+        _intent_names = names
+        _intent_offsets = offsets
+        _intent_matrix = matrix
+        return matrix
+
+
+def _score_intents(matrix: np.ndarray, offsets: np.ndarray, user_vector: np.ndarray, scale: float) -> np.ndarray:
+    """
+    Score every intent against a normalized query vector.
+    
+    Uses the average of each intent's top 3 example similarities: less sensitive to
+    outliers than max, and more discriminative than a plain average.
+    
+    Args:
+        matrix: Example embeddings (float32, or int8 multiplied by scale)
+        offsets: Row boundaries, intent i owns rows offsets[i]:offsets[i + 1]
+        user_vector: L2-normalized float32 query embedding
+        scale: Divisor that maps matrix products back to cosine similarities
+    
+    Returns:
+        float32 score per intent
+    """
+    all_similarities = (matrix @ user_vector) / scale
+    scores = np.empty(offsets.size - 1, dtype=np.float32)
+    for i in range(scores.size):
+        similarities = all_similarities[offsets[i]:offsets[i + 1]]
+        k = min(3, similarities.size)
+        scores[i] = np.partition(similarities, -k)[-k:].mean()
+    return scores
+
+
+# Seed for the top-3 buffer: below any cosine similarity, and finite (unlike -inf)
+_SCORE_FLOOR = -2.0
+
+
+if NUMBA_AVAILABLE:
+    # Only reassociation/contraction: full fastmath assumes no infs/NaNs
+    @njit(cache=True, fastmath={"reassoc", "contract"})
+    def _score_intents_compiled(matrix, offsets, user_vector, scale):
+        """Numba version of _score_intents: dot products and top-3 selection in one pass."""
+        n_intents = offsets.size - 1
+        dim = user_vector.size
+        scores = np.empty(n_intents, dtype=np.float32)
+        top = np.empty(3, dtype=np.float32)
+        for i in range(n_intents):
+            top[:] = _SCORE_FLOOR
+            for row in range(offsets[i], offsets[i + 1]):
+                similarity = 0.0
+                for j in range(dim):
+                    similarity += matrix[row, j] * user_vector[j]
+                similarity /= scale
+                # Keep top sorted descending (insertion into a 3-slot buffer)
+                if similarity > top[2]:
+                    top[2] = similarity
+                    if top[2] > top[1]:
+                        top[1], top[2] = top[2], top[1]
+                        if top[1] > top[0]:
+                            top[0], top[1] = top[1], top[0]
+            k = min(3, offsets[i + 1] - offsets[i])
+            scores[i] = top[:k].sum() / k
+        return scores
+
+
 def classify_intent(user_message: str) -> Dict[str, any]:
     """
     Classify user intent using embedding similarity to intent examples.
     Returns intent category and confidence score.
+    Repeated messages (ignoring case and whitespace) are answered from an LRU cache.
     """
-    if not EMBEDDING_AVAILABLE:
+    user_lower = " ".join(user_message.lower().split())
+    with _intent_cache_lock:
+        cached = _intent_cache.get(user_lower)
+        if cached is not None:
+            _intent_cache.move_to_end(user_lower)
+    if cached is not None:
+        # Copy so callers can't mutate the cached result
+        return {**cached, "all_scores": dict(cached["all_scores"])}
+    
+    # Small talk and clear-cut keyword matches skip the embedding model
+    if _GREETING_RE.match(user_lower):
+        return {
+            "intent": "general",
+            "confidence": KEYWORD_SHORTCUT_CONFIDENCE
+        }
+    keyword_result = classify_intent_keyword(user_lower)
+    if keyword_result["confidence"] >= KEYWORD_SHORTCUT_CONFIDENCE:
+        return keyword_result
+    
+    if not is_embedding_available():
         # Fallback to keyword-based classification
-        return classify_intent_keyword(user_message)
+        return keyword_result
     
     # Generate embedding for user message
-    user_embedding = generate_embedding(user_message.lower())
+    user_embedding = generate_embedding(user_lower)
     if user_embedding is None:
-        return classify_intent_keyword(user_message)
+        return keyword_result
     
     # Calculate similarity to each intent category
-    intent_scores = {}
-    for intent, examples in INTENT_EXAMPLES.items():
-        # Get average embedding for intent examples
-        example_embeddings = []
-        for example in examples:
-            emb = generate_embedding(example.lower())
-            if emb:
-                example_embeddings.append(emb)
-
-        if example_embeddings:
-            # Calculate similarity to all examples
-            similarities = [
-                cosine_similarity(user_embedding, ex_emb)
-                for ex_emb in example_embeddings
-            ]
-            # Use average of top 3 similarities for more robust scoring
-            # This is less sensitive to outliers than max, and more discriminative than average
-            top_similarities = sorted(similarities, reverse=True)[:3]
-            intent_scores[intent] = sum(top_similarities) / len(top_similarities)
-    
-    if not intent_scores:
+    example_matrix = _ensure_intent_embeddings()
+    if example_matrix is None or not _intent_names:
         return {
             "intent": "general",
             "confidence": 0.5
         }
+    
+    result = _classify_embedding(user_embedding, example_matrix)
+    with _intent_cache_lock:
+        _intent_cache[user_lower] = result
+        _intent_cache.move_to_end(user_lower)
+        while len(_intent_cache) > INTENT_CACHE_MAX_SIZE:
+            _intent_cache.popitem(last=False)
+    return {**result, "all_scores": dict(result["all_scores"])}
+
+
+def _classify_embedding(user_embedding: np.ndarray, example_matrix: np.ndarray) -> Dict[str, any]:
+    """Score a message embedding against the intent examples and pick the best intent."""
+    # Similarity to every example of every intent in one matrix-vector product
+    # Normalize the query once so every row product below is a cosine similarity
+    user_vector = np.asarray(user_embedding, dtype=np.float32)
+    norm = np.linalg.norm(user_vector)
+    if norm > 0:
+        user_vector = user_vector / norm
+    scale = _INT8_SCALE if example_matrix.dtype == np.int8 else 1.0
+    # Scores stay a float32 vector parallel to intent_names until the result dict is built
+    intent_names = _intent_names
+    score_intents = _score_intents_compiled if NUMBA_AVAILABLE else _score_intents
+    scores = score_intents(example_matrix, _intent_offsets, user_vector, scale)
 
     # Get intent with highest score
-    sorted_intents = sorted(intent_scores.items(), key=lambda x: x[1], reverse=True)
-    best_intent, best_score = sorted_intents[0]
+    best_index = int(np.argmax(scores))
+    best_intent, best_score = intent_names[best_index], scores[best_index]
 
     # Calculate confidence with margin boost
     # If there's a clear winner (large margin), boost confidence
-    if len(sorted_intents) > 1:
-        second_best_score = sorted_intents[1][1]
+    if len(intent_names) > 1:
+        second_best_score = np.partition(scores, -2)[-2]
         margin = best_score - second_best_score
 
         # Boost confidence if there's a clear margin (>0.1)
@@ -212,7 +446,7 @@ def classify_intent(user_message: str) -> Dict[str, any]:
     return {
         "intent": best_intent,
         "confidence": float(confidence),
-        "all_scores": intent_scores
+        "all_scores": dict(zip(intent_names, scores.tolist()))
     }
 
 
@@ -222,52 +456,20 @@ def classify_intent_keyword(user_message: str) -> Dict[str, any]:
     """
     user_lower = user_message.lower()
 
-    # Enhanced keyword patterns with weighted scoring
-    keyword_patterns = {
-        "order_inquiry": {
-            "strong": ["order #", "tracking", "track order", "order status", "where is my order"],
-            "medium": ["order", "shipment", "delivery", "package"],
-            "weak": ["cancel", "modify", "change order"]
-        },
-        "technical_support": {
-            "strong": ["not working", "error message", "can't log", "won't load", "keeps crashing"],
-            "medium": ["error", "bug", "crash", "broken", "login issue"],
-            "weak": ["help", "problem", "issue", "trouble"]
-        },
-        "complaint": {
-            "strong": ["file a complaint", "very disappointed", "this is unacceptable", "terrible service"],
-            "medium": ["complaint", "unhappy", "disappointed", "frustrated", "angry"],
-            "weak": ["bad", "damaged", "wrong", "defective", "poor"]
-        },
-        "faq": {
-            "strong": ["return policy", "refund policy", "shipping cost", "business hours"],
-            "medium": ["policy", "how do i", "what is", "do you have", "can i"],
-            "weak": ["return", "refund", "shipping", "warranty"]
-        },
-    }
-
-    scores = {}
-    for intent, patterns in keyword_patterns.items():
-        score = 0
-        # Strong keywords: 1.0 point each
-        score += sum(1.0 for keyword in patterns["strong"] if keyword in user_lower)
-        # Medium keywords: 0.5 points each
-        score += sum(0.5 for keyword in patterns["medium"] if keyword in user_lower)
-        # Weak keywords: 0.2 points each
-        score += sum(0.2 for keyword in patterns["weak"] if keyword in user_lower)
-
-        # Normalize by dividing by max possible score (all strong keywords)
-        max_score = len(patterns["strong"]) * 1.0
-        scores[intent] = min(score / max_score, 1.0) if max_score > 0 else 0
-
-    # Check for greetings
-    greetings = ["hello", "hi", "hey", "good morning", "good afternoon"]
-    if any(greeting in user_lower for greeting in greetings) and len(user_lower.split()) <= 3:
+    # Check for greetings (decided before any keyword scoring)
+    if any(greeting in user_lower for greeting in _GREETINGS) and len(user_lower.split()) <= 3:
         return {
             "intent": "general",
             "confidence": 0.7  # Higher confidence for clear greetings
         }
 
+    # Strong keywords: 1.0 point each, medium: 0.5, weak: 0.2
+    scores = _keyword_scores(user_lower)
+    for intent, patterns in _KEYWORD_PATTERNS.items():
+        # Normalize by dividing by max possible score (all strong keywords)
+        max_score = len(patterns["strong"]) * 1.0
+        scores[intent] = min(scores[intent] / max_score, 1.0) if max_score > 0 else 0
+
     if not scores or max(scores.values()) == 0:
         return {
             "intent": "general",
@@ -0,0 +1,107 @@
+"""
+Semantic cache for generated AI responses.
+Tier 1 is an exact match on the normalized question; tier 2 compares the question's
+embedding against recently answered ones, so near-duplicate questions skip both the
+knowledge base search and the LLM call.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.services.llm_providers.semantic_cache import SemanticLLMCache
+
+logger = logging.getLogger(__name__)
+
+AI_RESPONSE_CACHE_ENABLED = os.getenv("AI_RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+AI_RESPONSE_CACHE_TTL = int(os.getenv("AI_RESPONSE_CACHE_TTL", "3600"))
+AI_RESPONSE_CACHE_MAX_SIZE = int(os.getenv("AI_RESPONSE_CACHE_MAX_SIZE", "2048"))
+AI_RESPONSE_CACHE_THRESHOLD = float(os.getenv("AI_RESPONSE_CACHE_THRESHOLD", "0.95"))
+
+_lock = threading.Lock()
+# Tier 1: blake2b(namespace, question) -> (expires_at, result)
+_exact: "OrderedDict[str, tuple]" = OrderedDict()
+# Tier 2: one vector store per embedding dimension (vectors of different models never compare)
+_similar: Dict[int, SemanticLLMCache] = {}
+_stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+
+def is_enabled() -> bool:
+    """Check whether AI response caching is enabled."""
+    return AI_RESPONSE_CACHE_ENABLED
+
+
+def get_stats() -> Dict[str, int]:
+    """Get cache hit/miss counters."""
+    return dict(_stats)
+
+
+def _exact_key(namespace: str, message: str) -> str:
+    return hashlib.blake2b(f"{namespace}\n{message.strip().lower()}".encode(), digest_size=16).hexdigest()
+
+
+def lookup(namespace: str, message: str, embedding: Optional[np.ndarray] = None) -> Optional[Dict]:
+    """
+    Look up a cached response for a question.
+    
+    Args:
+        namespace: Settings the response depends on (provider, model, tone, embedding model)
+        message: User's question
+        embedding: L2-normalized question embedding (enables the similarity tier)
+    
+    Returns:
+        Copy of the cached result dict, or None on miss
+    """
+    key = _exact_key(namespace, message)
+    with _lock:
+        entry = _exact.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _exact.move_to_end(key)
+                _stats["exact_hits"] += 1
+                return dict(entry[1])
+            del _exact[key]
+        store = _similar.get(len(embedding)) if embedding is not None else None
+    
+    if store is not None:
+        result = store.lookup(namespace, np.asarray(embedding, dtype=np.float32))
+        if result is not None:
+            _stats["semantic_hits"] += 1
+            return dict(result)
+    
+    _stats["misses"] += 1
+    return None
+
+
+def store(namespace: str, message: str, embedding: Optional[np.ndarray], result: Dict) -> None:
+    """Cache a generated result under the question and (optionally) its embedding."""
+    key = _exact_key(namespace, message)
+    with _lock:
+        _exact[key] = (time.monotonic() + AI_RESPONSE_CACHE_TTL, dict(result))
+        _exact.move_to_end(key)
+        while len(_exact) > AI_RESPONSE_CACHE_MAX_SIZE:
+            _exact.popitem(last=False)
+        if embedding is None:
+            return
+        dim = len(embedding)
+        if dim not in _similar:
+            _similar[dim] = SemanticLLMCache(
+                max_size=AI_RESPONSE_CACHE_MAX_SIZE,
+                threshold=AI_RESPONSE_CACHE_THRESHOLD,
+                dim=dim
+            )
+        similar = _similar[dim]
+    similar.store(namespace, np.asarray(embedding, dtype=np.float32), dict(result), ttl=AI_RESPONSE_CACHE_TTL)
+
+
+def clear() -> None:
+    """Drop all cached responses (call when the knowledge base changes)."""
+    with _lock:
+        _exact.clear()
+        _similar.clear()
+    logger.debug("[Response Cache] Cleared")
@@ -2,8 +2,13 @@
 Supabase Storage service for file uploads.
 Handles file storage in Supabase Storage buckets.
 """
+import asyncio
 import os
-from typing import Optional
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
 from fastapi import UploadFile
 
 # Try to import Supabase (optional dependency)
@@ -20,25 +25,41 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # Signed URL expiration in seconds (default: 1 year for knowledge base files)
 SIGNED_URL_EXPIRATION = int(os.getenv("SIGNED_URL_EXPIRATION", "31536000"))  # 1 year
 
+# Uploads up to this size are sent from memory; larger ones are spooled to disk in chunks
+UPLOAD_IN_MEMORY_MAX_BYTES = int(os.getenv("UPLOAD_IN_MEMORY_MAX_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Signed URL cache: (bucket, path) -> (url, monotonic expiry, expires_in it was signed with).
+# Entries are dropped this many seconds before the URL itself expires.
+SIGNED_URL_CACHE_MARGIN = 300
+SIGNED_URL_CACHE_MAX_SIZE = int(os.getenv("SIGNED_URL_CACHE_MAX_SIZE", "10000"))
+_signed_url_cache: "OrderedDict[Tuple[str, str], Tuple[str, float, int]]" = OrderedDict()
+_signed_url_cache_lock = threading.Lock()
+
 _supabase_client: Optional[object] = None
+_supabase_client_lock = threading.Lock()
 
 
 def get_supabase_client() -> Optional[object]:
-    """Get or create Supabase client."""
+    """Get or create Supabase client (created once, even under concurrent first calls)."""
     global _supabase_client
     
+    if _supabase_client is not None:
+        return _supabase_client
+    
     if not SUPABASE_AVAILABLE:
         return None
     
     if not SUPABASE_URL or not SUPABASE_KEY:
         return None
     
-    if _supabase_client is None:
-        try:
-            _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        except Exception as e:
-            print(f"Error creating Supabase client: {e}")
-            return None
+    with _supabase_client_lock:
+        if _supabase_client is None:
+            try:
+                _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+            except Exception as e:
+                print(f"Error creating Supabase client: {e}")
+                return None
     
     return _supabase_client
 
@@ -73,7 +94,6 @@ async def upload_file_to_supabase(
     if folder:
         file_path_parts.append(folder)
     # Add timestamp to filename to avoid conflicts
-    import time
     filename_parts = file.filename.rsplit('.', 1)
     if len(filename_parts) == 2:
         filename = f"{filename_parts[0]}_{int(time.time())}.{filename_parts[1]}"
@@ -82,36 +102,85 @@ async def upload_file_to_supabase(
     file_path_parts.append(filename)
     file_path = "/".join(file_path_parts)
     
-    # Read file content
-    file_content = await file.read()
+    # Small files are read into memory; large ones are copied to a temp file chunk by chunk
+    # and streamed from it, so memory stays bounded by the chunk size
+    file_content = await _spool_upload(file)
     
     try:
-        # Upload file
-        response = client.storage.from_(bucket_name).upload(
-            path=file_path,
-            file=file_content,
-            file_options={"content-type": file.content_type or "application/octet-stream"}
+        # The Supabase client is synchronous - keep the upload and signing off the event loop
+        return await asyncio.to_thread(
+            _upload_and_get_url,
+            client,
+            bucket_name,
+            file_path,
+            file_content,
+            file.content_type or "application/octet-stream",
+            use_signed_url
         )
         
-        # Generate signed URL for private buckets, or public URL for public buckets
-        if use_signed_url:
-            # For private buckets, generate a signed URL
-            signed_url_response = client.storage.from_(bucket_name).create_signed_url(
-                path=file_path,
-                expires_in=SIGNED_URL_EXPIRATION
-            )
-            signed_url = signed_url_response.get("signedURL")
-            if not signed_url:
-                raise Exception("Failed to generate signed URL. Make sure you're using the service role key (not anon key) for private buckets.")
-            return signed_url
-        else:
-            # For public buckets, use public URL
-            public_url_response = client.storage.from_(bucket_name).get_public_url(file_path)
-            return public_url_response
-        
     except Exception as e:
         print(f"Error uploading file to Supabase: {e}")
         raise Exception(f"Failed to upload file: {e}")
+    finally:
+        if isinstance(file_content, str):
+            try:
+                os.unlink(file_content)
+            except OSError:
+                pass
+
+
+def _upload_and_get_url(
+    client,
+    bucket_name: str,
+    file_path: str,
+    file_content: Union[bytes, str],
+    content_type: str,
+    use_signed_url: bool
+) -> str:
+    """Upload file content (bytes, or a temp file path) and return its signed or public URL."""
+    bucket = client.storage.from_(bucket_name)
+    file_options = {"content-type": content_type}
+    if isinstance(file_content, str):
+        # Pass an open handle: given a path, the client opens the file and never closes it
+        with open(file_content, "rb") as fh:
+            bucket.upload(path=file_path, file=fh, file_options=file_options)
+    else:
+        bucket.upload(path=file_path, file=file_content, file_options=file_options)
+    
+    # Generate signed URL for private buckets, or public URL for public buckets
+    if use_signed_url:
+        # For private buckets, generate a signed URL
+        signed_url_response = bucket.create_signed_url(
+            path=file_path,
+            expires_in=SIGNED_URL_EXPIRATION
+        )
+        signed_url = signed_url_response.get("signedURL")
+        if not signed_url:
+            raise Exception("Failed to generate signed URL. Make sure you're using the service role key (not anon key) for private buckets.")
+        # Cache it so the first read doesn't re-sign
+        _cache_signed_url(bucket_name, file_path, signed_url, SIGNED_URL_EXPIRATION)
+        return signed_url
+    # For public buckets, use public URL
+    return bucket.get_public_url(file_path)
+
+
+async def _spool_upload(file: UploadFile) -> Union[bytes, str]:
+    """
+    Get upload content for the Supabase client.
+    
+    Returns:
+        File bytes if the upload is small, otherwise the path of a temp file holding it
+        (caller deletes it)
+    """
+    size = getattr(file, "size", None)
+    if size is not None and size <= UPLOAD_IN_MEMORY_MAX_BYTES:
+        return await file.read()
+    
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            tmp.write(chunk)
+        return tmp.name
 
 
 def delete_file_from_supabase(
@@ -137,6 +206,8 @@ def delete_file_from_supabase(
     
     try:
         client.storage.from_(bucket_name).remove([file_path])
+        with _signed_url_cache_lock:
+            _signed_url_cache.pop((bucket_name, file_path), None)
         return True
     except Exception as e:
         print(f"Error deleting file from Supabase: {e}")
@@ -151,6 +222,7 @@ def get_signed_url(
     """
     Get a signed URL for a file in Supabase Storage.
     Useful for generating new signed URLs when stored URLs expire.
+    URLs are cached per (bucket, path) until shortly before they expire.
     
     Args:
         file_path: Path to file in bucket
@@ -163,12 +235,21 @@ def get_signed_url(
     if not SUPABASE_AVAILABLE:
         return None
     
+    expiration = expires_in if expires_in is not None else SIGNED_URL_EXPIRATION
+    key = (bucket_name, file_path)
+    with _signed_url_cache_lock:
+        cached = _signed_url_cache.get(key)
+        if cached is not None:
+            url, expiry, signed_for = cached
+            if signed_for == expiration and time.monotonic() < expiry:
+                _signed_url_cache.move_to_end(key)
+                return url
+    
     client = get_supabase_client()
     if not client:
         return None
     
     try:
-        expiration = expires_in if expires_in is not None else SIGNED_URL_EXPIRATION
         response = client.storage.from_(bucket_name).create_signed_url(
             path=file_path,
             expires_in=expiration
@@ -176,8 +257,23 @@ def get_signed_url(
         signed_url = response.get("signedURL")
         if not signed_url:
             print("Warning: Failed to generate signed URL. Make sure you're using the service role key (not anon key) for private buckets.")
+        else:
+            _cache_signed_url(bucket_name, file_path, signed_url, expiration)
         return signed_url
     except Exception as e:
         print(f"Error creating signed URL: {e}")
         return None
 
+
+
+def _cache_signed_url(bucket_name: str, file_path: str, url: str, expires_in: int) -> None:
+    """Remember a signed URL until SIGNED_URL_CACHE_MARGIN seconds before it expires."""
+    ttl = expires_in - SIGNED_URL_CACHE_MARGIN
+    if ttl <= 0:
+        return
+    key = (bucket_name, file_path)
+    with _signed_url_cache_lock:
+        _signed_url_cache[key] = (url, time.monotonic() + ttl, expires_in)
+        _signed_url_cache.move_to_end(key)
+        while len(_signed_url_cache) > SIGNED_URL_CACHE_MAX_SIZE:
+            _signed_url_cache.popitem(last=False)
@@ -0,0 +1,53 @@
+"""
+Tests for the streaming size cap on AI responses.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("psycopg2")
+pytest.importorskip("cryptography")
+
+from app.routers.ai import _cap_stream  # noqa: E402
+
+
+class _Source:
+    """Async chunk stream that records whether it was closed."""
+
+    def __init__(self, chunks):
+        self.closed = False
+        self._chunks = chunks
+
+    async def stream(self):
+        try:
+            for chunk in self._chunks:
+                yield chunk
+        finally:
+            self.closed = True
+
+
+async def _collect(chunks, max_bytes):
+    return [chunk async for chunk in _cap_stream(chunks, max_bytes=max_bytes)]
+
+
+def test_stream_under_limit_is_forwarded_unchanged():
+    source = _Source(["ab", "cd", "ef"])
+    
+    assert asyncio.run(_collect(source.stream(), max_bytes=6)) == ["ab", "cd", "ef"]
+
+
+def test_stream_over_limit_is_truncated_and_closed():
+    source = _Source(["ab", "cd", "ef", "gh"])
+    
+    assert asyncio.run(_collect(source.stream(), max_bytes=5)) == ["ab", "cd", "[truncated]"]
+    assert source.closed
+
+
+def test_limit_counts_encoded_bytes():
+    # "é" is 2 bytes in UTF-8
+    source = _Source(["éé", "é"])
+    
+    assert asyncio.run(_collect(source.stream(), max_bytes=5)) == ["éé", "[truncated]"]
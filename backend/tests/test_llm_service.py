@@ -0,0 +1,72 @@
+"""
+Tests for the startup migration of legacy encrypted API keys.
+"""
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("psycopg2")
+pytest.importorskip("cryptography")
+
+from app.services import llm_service  # noqa: E402
+from app.services.llm_providers.encryption import (  # noqa: E402
+    ENCRYPTED_PREFIX,
+    decrypt_llm_config,
+    encrypt_llm_config,
+    get_fernet,
+)
+
+
+class _Config:
+    def __init__(self, llm_config):
+        self.llm_config = llm_config
+
+
+class _FakeSession:
+    """Just enough of a Session for migrate_legacy_api_keys: query().all() and commit()."""
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.commits = 0
+
+    def query(self, model):
+        return self
+
+    def all(self):
+        return self.configs
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_legacy_keys_are_marked_once():
+    legacy_token = get_fernet().encrypt(b"sk-legacy").decode()
+    legacy = _Config({"provider": "openai", "api_key": legacy_token})
+    current = _Config(encrypt_llm_config({"provider": "openai", "api_key": "sk-current"}))
+    current_config = current.llm_config
+    unset = _Config({"provider": "ollama"})
+    db = _FakeSession([legacy, current, unset])
+    
+    assert llm_service.migrate_legacy_api_keys(db) == 1
+    
+    assert db.commits == 1
+    assert legacy.llm_config["api_key"].startswith(ENCRYPTED_PREFIX)
+    assert decrypt_llm_config(legacy.llm_config)["api_key"] == "sk-legacy"
+    assert current.llm_config is current_config
+    assert unset.llm_config == {"provider": "ollama"}
+
+
+def test_nothing_to_migrate_does_not_commit():
+    db = _FakeSession([_Config(encrypt_llm_config({"api_key": "sk-current"})), _Config(None)])
+    
+    assert llm_service.migrate_legacy_api_keys(db) == 0
+    assert db.commits == 0
+
+
+def test_undecryptable_legacy_key_is_left_alone():
+    stale = _Config({"api_key": "not-a-fernet-token"})
+    db = _FakeSession([stale])
+    
+    assert llm_service.migrate_legacy_api_keys(db) == 0
+    assert stale.llm_config == {"api_key": "not-a-fernet-token"}
+    assert db.commits == 0
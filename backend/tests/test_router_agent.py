@@ -0,0 +1,88 @@
+"""
+Tests for the router agent's intent scoring kernels and shortcuts.
+"""
+from collections import OrderedDict
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+
+from app.services import router_agent  # noqa: E402
+
+requires_numba = pytest.mark.skipif(not router_agent.NUMBA_AVAILABLE, reason="numba not installed")
+
+
+def _random_inputs(seed: int, quantize: bool):
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((40, 384)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    scale = 1.0
+    if quantize:
+        matrix = np.round(matrix * router_agent._INT8_SCALE).astype(np.int8)
+        scale = router_agent._INT8_SCALE
+    # Intents with 2, 8, 1, 14 and 15 examples (1 example exercises k < 3)
+    offsets = np.array([0, 2, 10, 11, 25, 40], dtype=np.int64)
+    user_vector = rng.standard_normal(384).astype(np.float32)
+    user_vector /= np.linalg.norm(user_vector)
+    return matrix, offsets, user_vector, scale
+
+
+def test_scores_are_top3_mean_per_intent():
+    # Example i has cosine similarity similarities[i] with the query [1, 0]
+    similarities = np.array([0.9, 0.1, 0.5, 0.7, 0.3, -0.2, 0.4], dtype=np.float32)
+    matrix = np.stack([similarities, np.sqrt(1 - similarities ** 2)], axis=1).astype(np.float32)
+    offsets = np.array([0, 5, 7], dtype=np.int64)
+    user_vector = np.array([1.0, 0.0], dtype=np.float32)
+    
+    scores = router_agent._score_intents(matrix, offsets, user_vector, 1.0)
+    
+    assert scores.dtype == np.float32
+    # Intent 0: top 3 of its 5 examples; intent 1: only 2 examples, so k = 2
+    np.testing.assert_allclose(scores, [(0.9 + 0.7 + 0.5) / 3, (-0.2 + 0.4) / 2], atol=1e-6)
+
+
+def test_int8_scores_match_float_scores():
+    matrix, offsets, user_vector, _ = _random_inputs(0, quantize=False)
+    quantized, _, _, scale = _random_inputs(0, quantize=True)
+    
+    expected = router_agent._score_intents(matrix, offsets, user_vector, 1.0)
+    actual = router_agent._score_intents(quantized, offsets, user_vector, scale)
+    
+    np.testing.assert_allclose(actual, expected, atol=0.01)
+
+
+@requires_numba
+@pytest.mark.parametrize("quantize", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_compiled_scores_match_numpy(seed, quantize):
+    matrix, offsets, user_vector, scale = _random_inputs(seed, quantize)
+    
+    expected = router_agent._score_intents(matrix, offsets, user_vector, scale)
+    actual = router_agent._score_intents_compiled(matrix, offsets, user_vector, scale)
+    
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+
+@pytest.fixture
+def keyword_only(monkeypatch):
+    """Classify without the embedding model and with an empty intent cache."""
+    monkeypatch.setattr(router_agent, "_intent_cache", OrderedDict())
+    monkeypatch.setattr(router_agent, "is_embedding_available", lambda: False)
+
+
+@pytest.mark.parametrize("message", ["thanks", "Bye!", "Thank you so much.", "  hello   there "])
+def test_greeting_shortcut(keyword_only, message):
+    assert router_agent.classify_intent(message) == {
+        "intent": "general",
+        "confidence": router_agent.KEYWORD_SHORTCUT_CONFIDENCE,
+    }
+
+
+@pytest.mark.parametrize("message", ["hi my order is broken", "thanks but the refund never arrived"])
+def test_greeting_with_request_is_classified(keyword_only, monkeypatch, message):
+    keyword_result = {"intent": "technical_support", "confidence": 0.4}
+    monkeypatch.setattr(router_agent, "classify_intent_keyword", lambda text: keyword_result)
+    
+    assert router_agent.classify_intent(message) is keyword_result